@@ -1,277 +1,293 @@
 from collections import defaultdict
 from itertools import permutations
-from typing import Generator
+from math import factorial, prod
+from typing import Generator, Iterator
 from naive import normalForm
 from model import *
 from utils import *
+from engine import *
+from matching import maximumMatching, hasPerfectMatching
+from hashcons import shapeOf
+from refine import refineSplit
+from stats import SearchStats, timed
+from invariants import rejected
 
-Solution = dict[Variable, Variable]
 SizeClassMap = defaultdict[int, list[Type]]
 
-def comparePlain(t: Type, s: Type) -> Renaming | None:
-    t = normalForm(t)
-    s = normalForm(s)
-
-    solution = PlainSolve([Constraint(t, s)], {})
-    if solution is None:
+def compare(
+        t: Type, s: Type, strategy: Strategy | str = "constrPropSizeCount", nogoods: NogoodCache | None = None,
+        maxSteps: int | None = None, deadline: float | None = None, stats: SearchStats | None = None
+    ) -> Renaming | Unknown | None:
+    if isinstance(strategy, str):
+        strategy = solvers[strategy]
+    with timed(stats, "normalize"):
+        t = normalForm(t)
+        s = normalForm(s)
+    if rejected(t, s, stats):
         return None
-    return Renaming([[a, b] for a, b in solution.items()])
 
+    with timed(stats, "search"):
+        solution = Solve([Constraint(t, s)], {}, strategy, nogoods, Budget.of(maxSteps, deadline), stats)
+    if solution is None or solution is unknown:
+        return solution
+    return Renaming(solution) # type: ignore
 
-def compareSizeCount(t: Type, s: Type) -> Renaming | None:
-    t = normalForm(t)
-    s = normalForm(s)
 
-    solution = SizeCountSolve([Constraint(t, s)], {})
-    if solution is None:
-        return None
-    return Renaming([[a, b] for a, b in solution.items()])
+def comparePlain(
+        t: Type, s: Type, maxSteps: int | None = None, deadline: float | None = None,
+        stats: SearchStats | None = None
+    ) -> Renaming | Unknown | None:
+    return compare(t, s, plain, maxSteps=maxSteps, deadline=deadline, stats=stats)
 
 
-def compareConstrProp(t: Type, s: Type) -> Renaming | None:
-    t = normalForm(t)
-    s = normalForm(s)
+def compareSizeCount(
+        t: Type, s: Type, maxSteps: int | None = None, deadline: float | None = None,
+        stats: SearchStats | None = None
+    ) -> Renaming | Unknown | None:
+    return compare(t, s, sizeCount, maxSteps=maxSteps, deadline=deadline, stats=stats)
 
-    solution = ConstrPropSolve([Constraint(t, s)], {})
-    if solution is None:
-        return None
-    return Renaming([[a, b] for a, b in solution.items()])
 
+def compareConstrProp(
+        t: Type, s: Type, nogoods: NogoodCache | None = None,
+        maxSteps: int | None = None, deadline: float | None = None, stats: SearchStats | None = None
+    ) -> Renaming | Unknown | None:
+    return compare(t, s, constrProp, nogoods, maxSteps, deadline, stats)
 
-def compareConstrPropSizeCount(t: Type, s: Type) -> Renaming | None:
-    t = normalForm(t)
-    s = normalForm(s)
 
-    solution = SizeCountConstrPropSolve([Constraint(t, s)], {})
-    if solution is None:
-        return None
-    return Renaming([[a, b] for a, b in solution.items()])
+def compareConstrPropSizeCount(
+        t: Type, s: Type, nogoods: NogoodCache | None = None,
+        maxSteps: int | None = None, deadline: float | None = None, stats: SearchStats | None = None
+    ) -> Renaming | Unknown | None:
+    return compare(t, s, constrPropSizeCount, nogoods, maxSteps, deadline, stats)
+
+
+def compareRefined(
+        t: Type, s: Type, nogoods: NogoodCache | None = None,
+        maxSteps: int | None = None, deadline: float | None = None, stats: SearchStats | None = None
+    ) -> Renaming | Unknown | None:
+    return compare(t, s, refined, nogoods, maxSteps, deadline, stats)
+
 
+def compareOrganized(
+        t: Type, s: Type, strategy: Strategy | str = "constrPropSizeCount", nogoods: NogoodCache | None = None,
+        maxSteps: int | None = None, deadline: float | None = None, stats: SearchStats | None = None
+    ) -> Renaming | Unknown | None:
+    # equivalence modulo the organize rewriting, a coarser relation than the
+    # other compare functions: a renaming of the organized forms of t and s,
+    # and variables only under an A -> ω do not appear in it. Every path is
+    # a member of one flat intersection, and paths of equal spine length and
+    # argument shapes share a shape, so the compatibility graph of that
+    # intersection only pairs paths within their group
+    with timed(stats, "organize"):
+        t = organize(t)
+        s = organize(s)
+    assert all(map(isPath, t.types)) and all(map(isPath, s.types))
+    return compare(t, s, strategy, nogoods, maxSteps, deadline, stats)
 
-def applySolution(C: list[VariableConstraint], S: Solution) -> bool:
+
+def applySolution(C: list[VariableConstraint], S: Solution) -> list[VariableConstraint] | None:
+    reduced = []
     for c in C:
-        for a in list(c.left):
+        left = [a for a in c.left if a not in S]
+        right = list(c.right)
+        for a in c.left:
             if a in S:
-                try: c.right.remove(S[a])
-                except ValueError: return False
-                c.left.remove(a)
-    return True
-
-@dataclass
-class Occurrence:
-    var: Variable
-    used: bool = False
-    # constraint: VariableConstraint
+                try: right.remove(S[a])
+                except ValueError: return None
+        reduced.append(VariableConstraint(left, right)) # type: ignore
+    return reduced
 
-@dataclass
-class AllowedVariable:
-    var: Variable
-    evidence: list[Occurrence]
+SignatureClass = tuple[list[Variable], list[Variable]]
 
-    def __eq__(self, other: 'AllowedVariable') -> bool:
-        return self.var == other.var
+def signatureClasses(C: list[VariableConstraint], S: Solution) -> list[SignatureClass] | None:
+    reduced = applySolution(C, S)
+    if reduced is None:
+        return None
 
-    def __hash__(self) -> int:
-        return hash(self.var)
+    # variables already taken by the solution can not be matched again
+    taken = set(S.values())
+    for constr in reduced:
+        if any(var in taken for var in constr.right):
+            return None
 
+    # a variable and its image must occur in exactly the same constraints
+    leftSigs: defaultdict[Variable, list[int]] = defaultdict(list)
+    rightSigs: defaultdict[Variable, list[int]] = defaultdict(list)
+    for i, constr in enumerate(reduced):
+        for v in constr.left:
+            leftSigs[v].append(i)
+        for v in constr.right:
+            rightSigs[v].append(i)
 
-AllowedMap = dict[Variable, set[Variable]]
-AllowedList = list[tuple[Variable, set[AllowedVariable]]]
+    classes: defaultdict[tuple[int, ...], SignatureClass] = defaultdict(lambda: ([], []))
+    for v, sig in leftSigs.items():
+        classes[tuple(sig)][0].append(v)
+    for v, sig in rightSigs.items():
+        classes[tuple(sig)][1].append(v)
+    return list(classes.values())
 
 
-def propagationCase(c: VariableConstraint, C: list[Constraint], S: Solution) -> Solution | None:
-    allowed: dict[Variable, set[AllowedVariable]] = {}
+def propagationCase(C: list[VariableConstraint], S: Solution) -> Solution | None:
+    classes = signatureClasses(C, S)
+    if classes is None:
+        return None
 
-    if not applySolution([c] + C, S): #type: ignore
+    allowed = {v: right for left, right in classes for v in left}
+    matching = solveVariableConstraints(allowed)
+    if matching is None:
         return None
-    
-    occurrences: list[list[Occurrence]] = []
-    # constraints: list[tuple[set[Variable], set[AllowedVariable]]] = []
-    for constr in c, *C:
-        assert isinstance(constr, VariableConstraint)
-        occurrences.append([Occurrence(var) for var in constr.right])
-
-    # for v in c.left:
-    #     # guaranteed that v was never here before
-    #     allowed[v] = set(AllowedVariable(var, ) for var in c.right)
-
-    for constr, occs in zip([c] + C, occurrences):
-        assert isinstance(constr, VariableConstraint)
-        for v in constr.left:
-            if v not in allowed:
-                allowed[v] = set(AllowedVariable(occ.var, [occ]) for occ in occs)
-            else:
-                # find intersection
-                for allowedVar in allowed[v].copy():
-                    if allowedVar.var not in constr.right:
-                        allowed[v].remove(allowedVar)
-                    else:
-                        for occ in occs:
-                            if occ.var == allowedVar.var:
-                                allowedVar.evidence.append(occ)
-                                break
-                        else: assert False
-
-                # allowed[v].intersection(varConstr.right)
-                # allowed[v].intersection_update(varConstr.right)
-    
-    allowedList = sorted(allowed.items(), key=lambda item: len(item[1]))
-    solution = solveVariableConstraints(allowedList) # type: ignore
-    if solution is None: return None
 
-    assert len(solution) == len(allowedList)
+    return S | matching
 
-    S.update({k[0]: v for k, v in zip(allowedList, solution)})
-    return S
 
+def propagationCases(C: list[VariableConstraint], S: Solution) -> Iterator[Solution]:
+    # any bijection inside every signature class completes S
+    classes = signatureClasses(C, S)
+    if classes is None or any(len(left) != len(right) for left, right in classes):
+        return
 
-def solveVariableConstraints(allowed: AllowedList) -> list[Variable] | None:
-    if not allowed:
-        return []
-    
-    (a, allowedVars), *allowed = allowed
+    # permutations lazily class by class, product would hold all of them
+    def extend(i: int, partial: Solution) -> Iterator[Solution]:
+        if i == len(classes):
+            yield partial
+            return
+        left, right = classes[i]
+        for p in permutations(right):
+            yield from extend(i + 1, partial | dict(zip(left, p)))
 
-    if not allowedVars:
-        # conflicting constraints on v
+    yield from extend(0, dict(S))
+
+
+def propagationCount(C: list[VariableConstraint], S: Solution) -> int:
+    classes = signatureClasses(C, S)
+    if classes is None or any(len(left) != len(right) for left, right in classes):
+        return 0
+    return prod(factorial(len(left)) for left, _ in classes)
+
+
+def solveVariableConstraints(allowed: dict[Variable, list[Variable]]) -> Solution | None:
+    matching = maximumMatching(allowed)
+    if len(matching) != len(allowed):
+        # some variable has no free image left
         return None
+    return matching
 
-    def isTaken(allowedVar: AllowedVariable) -> bool:
-        for occ in allowedVar.evidence:
-            if occ.used:
-                return True
-        return False
-    
-    for allowedVar in allowedVars:
-        if isTaken(allowedVar):
-            continue
 
-        for occ in allowedVar.evidence:
-            occ.used = True
+def memberKey(t: Type) -> tuple[bytes, int]:
+    # renaming invariants a member shares with any member it can pair with
+    return shapeOf(t), len(t.vars)
 
-        solution = solveVariableConstraints(allowed)
-        if solution is not None:
-            return [allowedVar.var] + solution
 
-        for occ in allowedVar.evidence:
-            occ.used = False
-    
-    return None
+def compatible(t1: Type, t2: Type, S: Solution, taken: set[Variable]) -> bool:
+    # whether the bindings made so far allow Constraint(t1, t2)
+    if isinstance(t1, Variable):
+        return S[t1] == t2 if t1 in S else t2 not in taken
+    for a in t1.vars:
+        if a in S and S[a] not in t2.vars:
+            return False
+    return True
 
 
-def SizeCountConstrPropSolve(C: list[Constraint], S: Solution) -> Solution | None:
-    if not C:
-        return S
+# right members each left member may pair with, by index
+Compatibility = list[list[int]]
 
-    c, *C1 = C
-    
-    # propagation step
-    if isinstance(c, VariableConstraint):
-        return propagationCase(c, C1, S)
-        
-    match c.left, c.right:
-        case Variable(_) as a, Variable(_) as b:
-            if a not in S:
-                S1 = dict(S)
-                S1[a] = b
-                return SizeCountConstrPropSolve(C1, S1)
-            elif S[a] == b:
-                return SizeCountConstrPropSolve(C1, S)
-            else:
-                return None
-        case Arrow(l1, r1), Arrow(l2, r2):
-            return SizeCountConstrPropSolve([Constraint(l1, l2), Constraint(r1, r2)] + C1, S)
-        case Intersection(types1), Intersection(types2):
-            if len(types1) != len(types2):
-                return None
-            if not types1:
-                return SizeCountConstrPropSolve(C1, S)
-
-            varBound = getVarBound(types1, types2)
-            if varBound is None: return None
-            
-            if varBound != 0:
-                varConstr = VariableConstraint(types1[:varBound], types2[:varBound]) # type: ignore
-                C1.append(varConstr)
-                if varBound == len(types1):
-                    return SizeCountConstrPropSolve(C1, S)
-                types1 = types1[varBound:]
-                types2 = types2[varBound:]
-            
-            gen = sizeSplit(types1, types2)
-            if gen is None: return None
-
-            for constraints in gen:
-                S1 = SizeCountConstrPropSolve(constraints + C1, S)
-                if S1 is not None:
-                    return S1
 
+def compatibilityGraph(types1: list[Type], types2: list[Type], S: Solution | None) -> Compatibility | None:
+    # None when no pairing of all the members exists
+    if len(types1) != len(types2):
+        return None
+    S = S or {}
+    taken = set(S.values())
+    keys2 = [memberKey(t2) for t2 in types2]
+    graph = []
+    for t1 in types1:
+        key = memberKey(t1)
+        row = [j for j, t2 in enumerate(types2) if keys2[j] == key and compatible(t1, t2, S, taken)]
+        if not row:
             return None
+        graph.append(row)
+    if all(len(row) == 1 for row in graph):
+        # members told apart by their invariants alone
+        return graph if len({row[0] for row in graph}) == len(graph) else None
+    if not hasPerfectMatching(dict(enumerate(graph))):
+        return None
+    return graph
+
+
+def perfectMatchings(graph: Compatibility) -> Generator[list[int], None, None]:
+    # right index for each left one, the left member with the fewest free
+    # candidates is placed first and a pair is only taken when the remaining
+    # members can still all be paired, so no branch ends without a matching
+    if all(len(row) == 1 for row in graph):
+        yield [row[0] for row in graph]
+        return
+    matched = [-1] * len(graph)
+    used: set[int] = set()
+
+    def canComplete(rest: list[int]) -> bool:
+        if len(rest) <= 1:
+            return all(any(j not in used for j in graph[k]) for k in rest)
+        return hasPerfectMatching({k: [j for j in graph[k] if j not in used] for k in rest})
+
+    def place(left: list[int]) -> Generator[list[int], None, None]:
+        if not left:
+            yield list(matched)
+            return
+        i = min(left, key=lambda i: sum(j not in used for j in graph[i]))
+        rest = [k for k in left if k != i]
+        free = [j for j in graph[i] if j not in used]
+        for j in free:
+            used.add(j)
+            # the only candidate of a member is in every matching of the rest
+            if len(free) == 1 or canComplete(rest):
+                matched[i] = j
+                yield from place(rest)
+            used.discard(j)
 
+    yield from place(list(range(len(graph))))
 
-def ConstrPropSolve(C: list[Constraint], S: Solution) -> Solution | None:
-    if not C:
-        return S
 
-    c, *C1 = C
-    
-    # propagation step
-    if isinstance(c, VariableConstraint):
-       return propagationCase(c, C1, S)
-        
-    match c.left, c.right:
-        case Variable(_) as a, Variable(_) as b:
-            if a not in S:
-                S1 = dict(S)
-                S1[a] = b
-                return ConstrPropSolve(C1, S1)
-            elif S[a] == b:
-                return ConstrPropSolve(C1, S)
-            else:
-                return None
-        case Arrow(l1, r1), Arrow(l2, r2):
-            return ConstrPropSolve([Constraint(l1, l2), Constraint(r1, r2)] + C1, S)
-        case Intersection(types1), Intersection(types2):
-            if len(types1) != len(types2):
-                return None
-            if not types1:
-                return ConstrPropSolve(C1, S)
-
-            varBound = getVarBound(types1, types2)
-            if varBound is None: return None
-            
-            if varBound != 0:
-                varConstr = VariableConstraint(types1[:varBound], types2[:varBound]) # type: ignore
-                C1.append(varConstr)
-                if varBound == len(types1):
-                    return ConstrPropSolve(C1, S)
-                types1 = types1[varBound:]
-                types2 = types2[varBound:]
-                # constr = [Constraint(
-                #     Intersection(types1[varBound:]),
-                #     Intersection(types2[varBound:])
-                # )] if varBound != len(types1) else []
-                # return solveWithConstraintProp(constr + C1 + [varConstr], S)
-
-            for p in permutations(types2):
-                S1 = ConstrPropSolve([Constraint(t1, t2) for t1, t2 in zip(types1, p)] + C1, S)
-                if S1 is not None:
-                    return S1
+def permutationSplit(
+        types1: list[Type], types2: list[Type], S: Solution | None = None
+    ) -> Generator[list[Constraint], None, None]:
+    graph = compatibilityGraph(types1, types2, S)
+    if graph is None:
+        return
+    for m in perfectMatchings(graph):
+        yield [Constraint(t1, types2[j]) for t1, j in zip(types1, m)]
 
-            return None
 
-def getVarBound(types1: list[Type], types2: list[Type]) -> int | None:
-    varBound = 0
-    for v1, v2 in zip(types1, types2):
-        if isinstance(v1, Variable) and isinstance(v2, Variable):
-            varBound += 1
-        elif not isinstance(v1, Variable) and not isinstance(v2, Variable):
-            return varBound
-        else:
-            return None
-    return varBound
+def Solve(
+        C: list[Constraint], S: Solution, strategy: Strategy, nogoods: NogoodCache | None = None,
+        budget: Budget | None = None, stats: SearchStats | None = None
+    ) -> Solution | Unknown | None:
+    return Search(C, S, strategy, nogoods, budget, stats=stats).run()
+
+
+def RefineConstrPropSolve(
+        C: list[Constraint], S: Solution, nogoods: NogoodCache | None = None, budget: Budget | None = None,
+        stats: SearchStats | None = None
+    ) -> Solution | Unknown | None:
+    return Solve(C, S, refined, nogoods, budget, stats)
+
+
+def SizeCountConstrPropSolve(
+        C: list[Constraint], S: Solution, nogoods: NogoodCache | None = None, budget: Budget | None = None,
+        stats: SearchStats | None = None
+    ) -> Solution | Unknown | None:
+    return Solve(C, S, constrPropSizeCount, nogoods, budget, stats)
 
 
-def sizeSplit(types1: list[Type], types2: list[Type]) -> Generator[list[Constraint], None, None]:
+def ConstrPropSolve(
+        C: list[Constraint], S: Solution, nogoods: NogoodCache | None = None, budget: Budget | None = None,
+        stats: SearchStats | None = None
+    ) -> Solution | Unknown | None:
+    return Solve(C, S, constrProp, nogoods, budget, stats)
+
+
+def sizeSplit(
+        types1: list[Type], types2: list[Type], S: Solution | None = None
+    ) -> Generator[list[Constraint], None, None]:
     sizeClasses1: SizeClassMap = defaultdict(list)
     for t in types1:
         sizeClasses1[typeSize(t)].append(t)
@@ -288,82 +304,143 @@ def sizeSplit(types1: list[Type], types2: list[Type]) -> Generator[list[Constrai
         if len(types) != len(sizeClasses2[s]):
             return None
 
+    # every class must have a perfect matching before any is enumerated
+    graphs: dict[int, Compatibility] = {}
+    for size, class1 in sizeClasses1.items():
+        graph = compatibilityGraph(class1, sizeClasses2[size], S)
+        if graph is None:
+            return None
+        graphs[size] = graph
+
     def getConstraints(sizes: list[int]) -> Generator[list[Constraint], None, None]:
         if not sizes: 
             yield []
             return
         size, *sizes = sizes
-        class1 = sizeClasses1[size]
-        for p in permutations(sizeClasses2[size]):
+        class1, class2 = sizeClasses1[size], sizeClasses2[size]
+        for m in perfectMatchings(graphs[size]):
             for constraints in getConstraints(sizes):
-                yield [Constraint(t1, t2) for t1, t2 in zip(class1, p)] \
+                yield [Constraint(t1, class2[j]) for t1, j in zip(class1, m)] \
                     + constraints
     
     yield from getConstraints(list(sizeClasses1.keys()))
 
 
-def SizeCountSolve(C: list[Constraint], S: Solution) -> Solution | None:
-    if not C:
-        return S
-    
-    c, *C1 = C
-
-    match c.left, c.right:
-        case Variable(_) as a, Variable(_) as b:
-            if a not in S:
-                S1 = dict(S)
-                S1[a] = b
-                return SizeCountSolve(C1, S1)
-            elif S[a] == b:
-                return SizeCountSolve(C1, S)
-            else:
-                return None
-        case Arrow(l1, r1), Arrow(l2, r2):
-            return SizeCountSolve([Constraint(l1, l2), Constraint(r1, r2)] + C1, S)
-        case Intersection(types1), Intersection(types2):
-            if len(types1) != len(types2):
-                return None
-            if not types1:
-                return SizeCountSolve(C1, S)
-
-            gen = sizeSplit(types1, types2)
-            if gen is None: return None
-
-            for constraints in gen:
-                S1 = SizeCountSolve(constraints + C1, S)
-                if S1 is not None:
-                    return S1
-
-            return None
-
-
-def PlainSolve(C: list[Constraint], S: Solution) -> Solution | None:
-    if not C:
-        return S
-    
-    c, *C1 = C
-
-    match c.left, c.right:
-        case Variable(_) as a, Variable(_) as b:
-            if a not in S:
-                S1 = dict(S)
-                S1[a] = b
-                return PlainSolve(C1, S1)
-            elif S[a] == b:
-                return PlainSolve(C1, S)
-            else:
-                return None
-        case Arrow(l1, r1), Arrow(l2, r2):
-            return PlainSolve([Constraint(l1, l2), Constraint(r1, r2)] + C1, S)
-        case Intersection(types1), Intersection(types2):
-            if len(types1) != len(types2):
-                return None
-            if not types1:
-                return PlainSolve(C1, S)
-
-            for p in permutations(types2):
-                S1 = PlainSolve([Constraint(t1, t2) for t1, t2 in zip(types1, p)] + C1, S)
-                if S1 is not None:
-                    return S1
-
-            return None
+def SizeCountSolve(
+        C: list[Constraint], S: Solution, budget: Budget | None = None, stats: SearchStats | None = None
+    ) -> Solution | Unknown | None:
+    return Solve(C, S, sizeCount, budget=budget, stats=stats)
+
+
+def PlainSolve(
+        C: list[Constraint], S: Solution, budget: Budget | None = None, stats: SearchStats | None = None
+    ) -> Solution | Unknown | None:
+    return Solve(C, S, plain, budget=budget, stats=stats)
+
+
+def pairingCount(c: Constraint, eager: bool) -> int:
+    # number of pairings sizeSplit would try for an intersection constraint,
+    # without the variable members unless they are paired eagerly
+    types1, types2 = c.left.types, c.right.types # type: ignore
+    if len(types1) != len(types2):
+        return 0
+    if not eager:
+        types1 = [t for t in types1 if not isinstance(t, Variable)]
+        types2 = [t for t in types2 if not isinstance(t, Variable)]
+        if len(types1) != len(types2):
+            return 0
+    sizes1 = sorted(typeSize(t) for t in types1)
+    if sizes1 != sorted(typeSize(t) for t in types2):
+        return 0
+    count = 1
+    run = 0
+    for i, size in enumerate(sizes1):
+        run = run + 1 if i and sizes1[i - 1] == size else 1
+        count *= run
+    return count
+
+
+def mostConstrained(search: Search) -> int:
+    # forced steps first, then unit variable constraints,
+    # then the intersection with the fewest pairings
+    agenda = search.agenda
+    counts = search.cache.setdefault("pairings", {})
+    eager = search.strategy.variables is None
+    best, fewest = len(agenda) - 1, None
+    for i in reversed(range(len(agenda))):
+        c = agenda[i]
+        if not isinstance(c.left, Intersection) or not isinstance(c.right, Intersection) \
+                or isinstance(c, VariableConstraint):
+            return i
+        key = id(c.left), id(c.right)
+        count = counts.get(key)
+        if count is None:
+            count = counts[key] = pairingCount(c, eager)
+        if count <= 1:
+            return i
+        if fewest is None or count < fewest:
+            best, fewest = i, count
+
+    unit = search.nextUnit()
+    if unit is not None:
+        search.push([unit])
+        return len(agenda) - 1
+    return best
+
+
+deferred = VariableHandling(propagationCase, propagationCases, propagationCount)
+
+# the presets behind the compare functions, any other combination
+# can be passed to compare, allRenamings or countRenamings
+plain = Strategy(permutationSplit)
+sizeCount = Strategy(sizeSplit)
+constrProp = Strategy(permutationSplit, deferred)
+constrPropSizeCount = Strategy(sizeSplit, deferred)
+refined = Strategy(refineSplit, deferred)
+ordered = Strategy(sizeSplit, deferred, mostConstrained)
+
+solvers: dict[str, Strategy] = {
+    "plain": plain,
+    "sizeCount": sizeCount,
+    "constrProp": constrProp,
+    "constrPropSizeCount": constrPropSizeCount,
+    "refined": refined,
+    "ordered": ordered,
+}
+
+
+def allRenamings(
+        t: Type, s: Type, strategy: Strategy | str = "constrPropSizeCount",
+        maxSteps: int | None = None, deadline: float | None = None, stats: SearchStats | None = None
+    ) -> Iterator[Renaming | Unknown]:
+    # every renaming of t into s once, ends with unknown if the budget ran out
+    if isinstance(strategy, str):
+        strategy = solvers[strategy]
+    with timed(stats, "normalize"):
+        t = normalForm(t)
+        s = normalForm(s)
+    if rejected(t, s, stats):
+        return
+
+    search = Search([Constraint(t, s)], {}, strategy, budget=Budget.of(maxSteps, deadline), stats=stats)
+    for solution in search.solutions():
+        yield unknown if solution is unknown else Renaming(solution) # type: ignore
+
+
+def countRenamings(
+        t: Type, s: Type, strategy: Strategy | str = "constrPropSizeCount",
+        maxSteps: int | None = None, deadline: float | None = None, stats: SearchStats | None = None
+    ) -> int | Unknown:
+    # interchangeable variables are counted by their number of bijections,
+    # not one by one
+    if isinstance(strategy, str):
+        strategy = solvers[strategy]
+    with timed(stats, "normalize"):
+        t = normalForm(t)
+        s = normalForm(s)
+    if rejected(t, s, stats):
+        return 0
+
+    search = Search([Constraint(t, s)], {}, strategy, budget=Budget.of(maxSteps, deadline), stats=stats)
+    with timed(stats, "search"):
+        return search.count()
@@ -0,0 +1,80 @@
+from collections import defaultdict
+from typing import Callable, Iterable, Iterator
+from model import *
+from utils import normalForm
+from invariants import Invariants, invariants
+from algorithms import compareConstrPropSizeCount
+
+Comparison = Callable[[Type, Type], Renaming | None]
+
+
+class Library:
+    def __init__(self, types: Iterable[Type] = (), compare: Comparison = compareConstrPropSizeCount):
+        self.compare = compare
+        self.types: list[Type] = []
+        self.buckets: defaultdict[Invariants, list[int]] = defaultdict(list)
+        for t in types:
+            self.add(t)
+
+    def add(self, t: Type) -> int:
+        t = normalForm(t)
+        index = len(self.types)
+        self.types.append(t)
+        self.buckets[invariants(t)].append(index)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> Type:
+        return self.types[index]
+
+    def matches(self, t: Type) -> Iterator[tuple[int, Renaming]]:
+        t = normalForm(t)
+        for index in self.buckets.get(invariants(t), []):
+            r = self.compare(t, self.types[index])
+            if isinstance(r, Renaming):
+                yield index, r
+
+
+def findMatches(
+        t: Type, collection: Iterable[Type], compare: Comparison = compareConstrPropSizeCount
+    ) -> Iterator[tuple[int, Renaming]]:
+    t = normalForm(t)
+    key = invariants(t)
+    for index, s in enumerate(collection):
+        s = normalForm(s)
+        if invariants(s) != key:
+            continue
+        r = compare(t, s)
+        if isinstance(r, Renaming):
+            yield index, r
+
+
+# yields (index, class) for every type as soon as its class is known,
+# a class is numbered by the order of its first member
+def equivalenceClasses(
+        collection: Iterable[Type], compare: Comparison = compareConstrPropSizeCount
+    ) -> Iterator[tuple[int, int]]:
+    representatives: defaultdict[Invariants, list[tuple[int, Type]]] = defaultdict(list)
+    classes = 0
+    for index, s in enumerate(collection):
+        s = normalForm(s)
+        bucket = representatives[invariants(s)]
+        for cls, rep in bucket:
+            if isinstance(compare(rep, s), Renaming):
+                yield index, cls
+                break
+        else:
+            bucket.append((classes, s))
+            yield index, classes
+            classes += 1
+
+
+def partition(collection: Iterable[Type], compare: Comparison = compareConstrPropSizeCount) -> list[list[int]]:
+    classes: list[list[int]] = []
+    for index, cls in equivalenceClasses(collection, compare):
+        if cls == len(classes):
+            classes.append([])
+        classes[cls].append(index)
+    return classes
@@ -0,0 +1,232 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+from model import *
+from utils import normalForm, randomRename, organize
+from generators import testType, manyVariables, shuffled, collection
+from engine import unknown
+from stats import percentile
+from naive import naiveComparison
+from functools import partial
+from algorithms import compare, compareOrganized, solvers
+from canonical import compareCanonical
+from flat import compareFlat
+
+Comparison = Callable[..., Renaming | None]
+Case = tuple[Type, Type]
+
+# every strategy preset of algorithms.solvers is measured through compare
+algorithms: dict[str, Comparison] = {
+    "naive": naiveComparison,
+    **{name: partial(compare, strategy=strategy) for name, strategy in solvers.items()},
+    "canonical": compareCanonical,
+    "flat": compareFlat,
+    "organized": compareOrganized,
+}
+
+# the form a result is checked on, normalForm for the rest
+checkedForms: dict[str, Callable[[Type], Type]] = {
+    "organized": lambda t: normalForm(organize(t)),
+}
+
+# the constants of the measurements in Test.ipynb
+constWidth = 3
+constDepth = 4
+constVars = 5
+
+
+def combinatorCase(i: int) -> Case:
+    t = normalForm(collection[i % len(collection)])
+    s = normalForm(shuffled(randomRename(t)[0]))
+    return t, s
+
+
+# workload -> (case generator, default sizes)
+workloads: dict[str, tuple[Callable[[int], Case], list[int]]] = {
+    "depth": (lambda d: testType(d, constWidth, constVars)[:2], list(range(1, 50))),
+    "width": (lambda w: testType(constDepth, w, constVars)[:2], list(range(2, 30))),
+    "vars": (lambda v: manyVariables(constDepth, v // 2)[:2], list(range(2, 36, 2))),
+    "combinators": (combinatorCase, list(range(len(collection)))),
+}
+
+
+def makeCase(workload: str, size: int, run: int, seed: int) -> Case:
+    # every algorithm gets the same cases, whichever process runs them
+    random.seed(f"{seed}:{workload}:{size}:{run}")
+    generate, _ = workloads[workload]
+    return generate(size)
+
+
+def isCorrect(algorithm: str, t: Type, s: Type, r: Renaming | None) -> bool:
+    form = checkedForms.get(algorithm, normalForm)
+    return r is not None and form(r.applyTo(t)) == form(s)
+
+
+def measureMemory(algo: Comparison, t: Type, s: Type, timeout: float) -> int:
+    tracemalloc.start()
+    try:
+        algo(t, s, deadline=time.monotonic() + timeout)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def runCase(
+        algorithm: str, workload: str, size: int, runs: int, laps: int, timeout: float, seed: int
+    ) -> dict:
+    algo = algorithms[algorithm]
+    times: list[float] = [] # mean of the laps of a run, in milliseconds
+    timeouts = 0
+    wrong = 0
+    peak = 0
+    for run in range(runs):
+        t, s = makeCase(workload, size, run, seed)
+        total = 0
+        for _ in range(laps):
+            deadline = time.monotonic() + timeout
+            start = time.perf_counter_ns()
+            r = algo(t, s, deadline=deadline)
+            total += time.perf_counter_ns() - start
+            if r is unknown:
+                break
+        if r is unknown:
+            # a slow size is not worth its remaining runs, later sizes still run
+            timeouts += 1
+            break
+        if not isCorrect(algorithm, t, s, r):
+            wrong += 1
+        times.append(total / laps / 1e6)
+        if run == 0:
+            peak = measureMemory(algo, t, s, timeout)
+
+    result: dict = {
+        "algorithm": algorithm, "workload": workload, "size": size,
+        "runs": len(times), "timeouts": timeouts, "wrong": wrong, "peakMemory": peak,
+    }
+    if times:
+        result |= {
+            "mean": sum(times) / len(times),
+            "p50": percentile(times, 0.5),
+            "p90": percentile(times, 0.9),
+            "p99": percentile(times, 0.99),
+            "times": times,
+        }
+    return result
+
+
+def runAll(cases: list[tuple[str, str, int]], options: argparse.Namespace) -> list[dict]:
+    params = (options.runs, options.laps, options.timeout, options.seed)
+    if options.jobs == 1:
+        results = (runCase(*case, *params) for case in cases)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(options.jobs)
+        results = executor.map(runCase, *zip(*cases), *([p] * len(cases) for p in params))
+
+    collected = []
+    try:
+        for result in results:
+            collected.append(result)
+            report(result)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return collected
+
+
+def report(result: dict):
+    name = f"{result['algorithm']} {result['workload']}={result['size']}"
+    if "p50" not in result:
+        print(f"{name}: timeout", file=sys.stderr)
+        return
+    line = f"{name}: p50 {result['p50']:.3f} ms, p90 {result['p90']:.3f} ms, " \
+        f"peak {result['peakMemory'] / 1024:.1f} KiB"
+    if result["timeouts"]:
+        line += f", timeout after {result['runs']} runs"
+    if result["wrong"]:
+        line += f", {result['wrong']} WRONG"
+    print(line, file=sys.stderr)
+
+
+def regressions(results: list[dict], baseline: list[dict], threshold: float, noise: float) -> list[str]:
+    old = {(r["algorithm"], r["workload"], r["size"]): r for r in baseline}
+    found = []
+    for new in results:
+        key = (new["algorithm"], new["workload"], new["size"])
+        if key not in old:
+            continue
+        base = old[key]
+        name = f"{key[0]} {key[1]}={key[2]}"
+        if "p50" not in new:
+            if "p50" in base:
+                found.append(f"{name}: timeout, was p50 {base['p50']:.3f} ms")
+            continue
+        if new["wrong"] > base.get("wrong", 0):
+            found.append(f"{name}: {new['wrong']} wrong results")
+        if "p50" in base and new["p50"] > base["p50"] * (1 + threshold) \
+                and new["p50"] - base["p50"] > noise:
+            found.append(f"{name}: p50 {new['p50']:.3f} ms, was {base['p50']:.3f} ms")
+    return found
+
+
+def parseSizes(spec: str) -> list[int]:
+    # "1,2,5" or "start:stop[:step]" with stop excluded
+    if ":" in spec:
+        return list(range(*map(int, spec.split(":"))))
+    return [int(x) for x in spec.split(",")]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark of the comparison algorithms")
+    parser.add_argument("-a", "--algorithms", nargs="+", choices=algorithms, default=list(algorithms))
+    parser.add_argument("-w", "--workloads", nargs="+", choices=workloads, default=list(workloads))
+    parser.add_argument("--sizes", type=parseSizes, help="sizes for every workload instead of the defaults")
+    parser.add_argument("--runs", type=int, default=10, help="generated cases per size")
+    parser.add_argument("--laps", type=int, default=10, help="timed calls per case")
+    parser.add_argument("--timeout", type=float, default=1.0, help="seconds per call")
+    parser.add_argument("--seed", type=int, default=1000)
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="cases measured in parallel")
+    parser.add_argument("-o", "--output", help="file for the JSON results")
+    parser.add_argument("--baseline", help="JSON results to check for regressions against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p50 slowdown")
+    parser.add_argument("--noise", type=float, default=0.05, help="p50 slowdowns under this many ms are ignored")
+    options = parser.parse_args(argv)
+
+    cases = [
+        (algorithm, workload, size)
+        for workload in options.workloads
+        for size in (options.sizes or workloads[workload][1])
+        for algorithm in options.algorithms
+    ]
+    results = runAll(cases, options)
+
+    document = {
+        "meta": {
+            "python": platform.python_version(), "machine": platform.machine(),
+            "runs": options.runs, "laps": options.laps, "timeout": options.timeout,
+            "seed": options.seed, "jobs": options.jobs,
+        },
+        "results": results,
+    }
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(document, f, indent=1)
+
+    found = []
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)["results"]
+        found = regressions(results, baseline, options.threshold, options.noise)
+        for line in found:
+            print(f"regression: {line}", file=sys.stderr)
+    return 1 if found or any(r["wrong"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
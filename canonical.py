@@ -0,0 +1,303 @@
+from dataclasses import dataclass
+from typing import Iterator
+from hashlib import blake2b
+from model import *
+from utils import normalForm
+from engine import Budget, Unknown, unknown
+from invariants import rejected
+
+ColorMap = dict[Variable, int]
+
+LEFT, RIGHT, MEMBER, ROOT = range(4)
+
+
+@dataclass
+class Canonical:
+    form: Type
+    # original variables -> canonical variables
+    labeling: Renaming
+    encoding: str
+
+    @property
+    def fingerprint(self) -> str:
+        return blake2b(self.encoding.encode(), digest_size=16).hexdigest()
+
+
+def encode(t: Type) -> str:
+    parts = []
+    stack = [t]
+    while stack:
+        match stack.pop():
+            case Variable(name):
+                parts.append(f"V{name};")
+            case Arrow(l, r):
+                parts.append("A")
+                stack += [r, l]
+            case Intersection(types):
+                parts.append(f"I{len(types)};")
+                stack += reversed(types)
+    return "".join(parts)
+
+
+def canonicalVariable(i: int) -> Variable:
+    return Variable(f"v{i}")
+
+
+def compress(signatures: dict) -> dict:
+    # ranks depend only on the set of signatures, not on the visiting order
+    ranks = {sig: i for i, sig in enumerate(sorted(set(signatures.values())))}
+    return {k: ranks[sig] for k, sig in signatures.items()}
+
+
+def refine(t: Type, colors: ColorMap, budget: Budget | None = None) -> ColorMap:
+    positions: list[tuple[Type, int, int]] = []
+    stack = [(t, -1, ROOT)]
+    while stack:
+        node, parent, role = stack.pop()
+        index = len(positions)
+        positions.append((node, parent, role))
+        match node:
+            case Arrow(l, r):
+                stack += [(r, index, RIGHT), (l, index, LEFT)]
+            case Intersection(types):
+                stack += [(c, index, MEMBER) for c in reversed(types)]
+
+    nodes: dict[int, Type] = {id(node): node for node, _, _ in positions}
+    levels: dict[int, list[Type]] = {}
+    for node in nodes.values():
+        levels.setdefault(node.depth, []).append(node)
+    byDepth: dict[int, list[int]] = {}
+    depths = [0] * len(positions)
+    for i, (_, parent, _) in enumerate(positions):
+        if parent >= 0:
+            depths[i] = depths[parent] + 1
+        byDepth.setdefault(depths[i], []).append(i)
+
+    classes = len(set(colors.values()))
+    while True:
+        # a round costs a pass over t, a long refinement stops at the deadline
+        # with the colours it has, the caller sees the budget expired
+        if budget is not None and not budget.check():
+            return colors
+        up: dict[int, int] = {}
+        offset = 0
+        for depth in sorted(levels):
+            signatures = {}
+            for node in levels[depth]:
+                match node:
+                    case Variable(_) as a:
+                        signatures[id(node)] = (0, colors[a])
+                    case Arrow(l, r):
+                        signatures[id(node)] = (1, up[id(l)], up[id(r)])
+                    case Intersection(types):
+                        signatures[id(node)] = (2, *sorted(up[id(c)] for c in types))
+            ranked = compress(signatures)
+            up.update({k: offset + v for k, v in ranked.items()})
+            offset += len(set(ranked.values()))
+
+        down = [0] * len(positions)
+        offset = 0
+        for d in sorted(byDepth):
+            signatures = {}
+            for i in byDepth[d]:
+                node, parent, role = positions[i]
+                if role == ROOT:
+                    signatures[i] = (ROOT,)
+                    continue
+                parentNode = positions[parent][0]
+                match parentNode:
+                    case Arrow(l, r):
+                        sibling = r if role == LEFT else l
+                        signatures[i] = (role, down[parent], up[id(sibling)])
+                    case _:
+                        signatures[i] = (role, down[parent], up[id(parentNode)])
+            ranked = compress(signatures)
+            for i, v in ranked.items():
+                down[i] = offset + v
+            offset += len(set(ranked.values()))
+
+        contexts: dict[Variable, list[int]] = {a: [] for a in colors}
+        for i, (node, _, _) in enumerate(positions):
+            if isinstance(node, Variable):
+                contexts[node].append(down[i])
+        refined = compress({a: (colors[a], *sorted(contexts[a])) for a in colors})
+
+        refinedClasses = len(set(refined.values()))
+        if refinedClasses == classes:
+            return refined
+        colors, classes = refined, refinedClasses
+
+
+def relabel(t: Type, colors: ColorMap) -> tuple[str, Type, Renaming]:
+    labeling = Renaming([[a, canonicalVariable(c)] for a, c in colors.items()])
+    canon = normalForm(labeling.applyTo(t))
+    return encode(canon), canon, labeling
+
+
+def isSwapAutomorphism(t: Type, a: Variable, b: Variable) -> bool:
+    return normalForm(Renaming([[a, b], [b, a]]).applyTo(t)) == t
+
+
+def individualize(b: Variable, c: int, a: Variable, color: int) -> int:
+    # split a off its cell, keeping the order of all other cells
+    if c < color:
+        return 2 * c
+    if c > color:
+        return 2 * c + 1
+    return 2 * c + (b != a)
+
+
+def splitCell(colors: ColorMap, cell: list[Variable], color: int) -> ColorMap:
+    # every variable of the cell gets its own colour in the order of cell,
+    # keeping the order of all other cells
+    split = {b: c if c < color else c + len(cell) - 1 for b, c in colors.items()}
+    split.update({a: color + i for i, a in enumerate(cell)})
+    return split
+
+
+# a variable map that fixes a type, without the variables it keeps
+Automorphism = dict[Variable, Variable]
+
+
+def addAutomorphism(automorphisms: dict[frozenset, Automorphism], g: Automorphism):
+    moved = {a: b for a, b in g.items() if a != b}
+    automorphisms.setdefault(frozenset(moved.items()), moved)
+
+
+@dataclass
+class Branching:
+    # a node of the search tree whose cell is being tried variable by variable
+    prefix: set[Variable] # variables individualized on the way to it
+    colors: ColorMap
+    color: int
+    untried: Iterator[Variable]
+    # tried variables and their images under the automorphisms fixing prefix,
+    # which fix the node, so trying one of those gives the same leaves again
+    orbit: set[Variable]
+    # whether it is on the path to the first leaf
+    onFirstPath: bool
+    closedUnder: int = 0 # automorphisms found when the orbit was last closed
+
+    def close(self, start: list[Variable], automorphisms: dict[frozenset, Automorphism]):
+        fixing = [g for g in automorphisms.values() if self.prefix.isdisjoint(g)]
+        self.orbit.update(start)
+        while start:
+            b = start.pop()
+            for g in fixing:
+                c = g.get(b, b)
+                if c not in self.orbit:
+                    self.orbit.add(c)
+                    start.append(c)
+        self.closedUnder = len(automorphisms)
+
+    def next(self, automorphisms: dict[frozenset, Automorphism]) -> Variable | None:
+        if self.closedUnder < len(automorphisms):
+            self.close(list(self.orbit), automorphisms)
+        for a in self.untried:
+            if a not in self.orbit:
+                self.close([a], automorphisms)
+                return a
+        return None
+
+
+def canonicalForm(t: Type, budget: Budget | None = None) -> Canonical | Unknown:
+    t = normalForm(t)
+    first: tuple[str, Type, Renaming] | None = None
+    best: tuple[str, Type, Renaming] | None = None
+    automorphisms: dict[frozenset, Automorphism] = {}
+
+    stack: list[Branching] = []
+    node: tuple[set[Variable], ColorMap] | None = (set(), {a: 0 for a in t.vars})
+    while node is not None or stack:
+        if node is None:
+            branching = stack[-1]
+            a = branching.next(automorphisms)
+            if a is None:
+                stack.pop()
+            else:
+                colors = {b: individualize(b, c, a, branching.color) for b, c in branching.colors.items()}
+                node = branching.prefix | {a}, colors
+            continue
+
+        # a node refines and normalizes the whole type, so the clock is read at each
+        if budget is not None and not (budget.spend() and budget.check()):
+            break
+        prefix, colors = node
+        node = None
+        colors = refine(t, colors, budget)
+        if budget is not None and budget.expired:
+            break
+        cells: dict[int, list[Variable]] = {}
+        for a, c in colors.items():
+            cells.setdefault(c, []).append(a)
+        target = next((sorted(cells[c]) for c in sorted(cells) if len(cells[c]) > 1), None)
+
+        if target is None:
+            leaf = relabel(t, colors)
+            # two leaves with the same encoding differ by an automorphism
+            for known in (first, best):
+                if known is not None and known[0] == leaf[0]:
+                    addAutomorphism(automorphisms, {a: known[2].inverse(c) for a, c in leaf[2].items()}) # type: ignore
+                    break
+            if first is not None and first[0] == leaf[0]:
+                # the automorphism maps the subtree the first leaf is in, which
+                # is done, onto the one this leaf is in, back to where they part
+                while not stack[-1].onFirstPath:
+                    stack.pop()
+            if first is None:
+                first = leaf
+            if best is None or leaf[0] < best[0]:
+                best = leaf
+            continue
+
+        color = colors[target[0]]
+        symmetric = True
+        for a in target[1:]:
+            if budget is not None and not budget.check():
+                break
+            if not isSwapAutomorphism(t, target[0], a):
+                symmetric = False
+                break
+            addAutomorphism(automorphisms, {target[0]: a, a: target[0]})
+        if budget is not None and budget.expired:
+            break
+        if symmetric:
+            # every variable of the cell swaps with the first, so any order of
+            # individualizing them gives the same leaves
+            node = prefix | set(target), splitCell(colors, target, color)
+        else:
+            stack.append(Branching(prefix, colors, color, iter(target), set(), first is None))
+
+    if budget is not None and budget.expired:
+        return unknown
+    assert best is not None
+    encoding, canon, labeling = best
+    return Canonical(canon, labeling, encoding)
+
+
+def fingerprint(t: Type) -> str:
+    canon = canonicalForm(t)
+    assert isinstance(canon, Canonical)
+    return canon.fingerprint
+
+
+def compareCanonical(
+        t: Type, s: Type, maxSteps: int | None = None, deadline: float | None = None
+    ) -> Renaming | Unknown | None:
+    t = normalForm(t)
+    s = normalForm(s)
+    if rejected(t, s):
+        return None
+
+    budget = Budget.of(maxSteps, deadline)
+    ct = canonicalForm(t, budget)
+    if ct is unknown:
+        return unknown
+    cs = canonicalForm(s, budget)
+    if cs is unknown:
+        return unknown
+    assert isinstance(ct, Canonical) and isinstance(cs, Canonical)
+    if ct.encoding != cs.encoding:
+        return None
+
+    return Renaming({a: cs.labeling.inverse(c) for a, c in ct.labeling.items()}) # type: ignore
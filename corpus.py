@@ -0,0 +1,181 @@
+import mmap
+import struct
+import sys
+from array import array
+from typing import BinaryIO, Iterator
+from model import *
+from flat import FlatType, flatten, unflatten
+
+# file: magic, records, then an optional index of record offsets
+#   record: 'T', node count, name count (u32 each), names (u16 length + utf-8),
+#           tags (i8), args (i32) and ends (i32) of the flat encoding
+#   index:  'X', record offsets (u64 each), record count (u64), index magic
+# all numbers are little-endian, a file without its index is still readable
+# from the start, so a writer that did not finish leaves a usable prefix
+MAGIC = b"ITC1"
+INDEX_MAGIC = b"ITCI"
+
+_record = struct.Struct("<cII")
+_name = struct.Struct("<H")
+_offset = struct.Struct("<Q")
+
+
+class CorpusError(ValueError):
+    pass
+
+
+def _littleEndian(a: array) -> array:
+    if sys.byteorder == "big":
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a
+
+
+def encodeRecord(f: FlatType) -> bytes:
+    parts = [_record.pack(b"T", len(f.tags), len(f.names))]
+    for name in f.names:
+        data = name.encode()
+        parts += [_name.pack(len(data)), data]
+    parts += [f.tags.tobytes(), _littleEndian(f.args).tobytes(), _littleEndian(f.ends).tobytes()]
+    return b"".join(parts)
+
+
+def decodeRecord(data, offset: int) -> tuple[FlatType, int]:
+    # returns the record at offset and the offset after it
+    marker, nodes, count = _record.unpack_from(data, offset)
+    if marker != b"T":
+        raise CorpusError(f"no record at {offset}")
+    offset += _record.size
+    names = []
+    for _ in range(count):
+        (length,) = _name.unpack_from(data, offset)
+        offset += _name.size
+        names.append(bytes(data[offset:offset + length]).decode())
+        offset += length
+
+    arrays = []
+    for typecode, width in (("b", 1), ("i", 4), ("i", 4)):
+        a = array(typecode)
+        a.frombytes(data[offset:offset + nodes * width])
+        arrays.append(_littleEndian(a))
+        offset += nodes * width
+    tags, args, ends = arrays
+    return FlatType(tags, args, ends, tuple(names)), offset
+
+
+class CorpusWriter:
+    def __init__(self, path: str):
+        self.file: BinaryIO = open(path, "wb")
+        self.file.write(MAGIC)
+        self.offsets: list[int] = []
+
+    def write(self, t: Type | FlatType):
+        f = t if isinstance(t, FlatType) else flatten(t)
+        self.offsets.append(self.file.tell())
+        self.file.write(encodeRecord(f))
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.write(b"X")
+        for offset in self.offsets:
+            self.file.write(_offset.pack(offset))
+        self.file.write(_offset.pack(len(self.offsets)) + INDEX_MAGIC)
+        self.file.close()
+
+    def __enter__(self) -> 'CorpusWriter':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def writeCorpus(path: str, types) -> int:
+    with CorpusWriter(path) as writer:
+        for t in types:
+            writer.write(t)
+        return len(writer.offsets)
+
+
+def _checkMagic(magic: bytes):
+    if magic != MAGIC:
+        raise CorpusError("not a type corpus")
+
+
+def readFlat(path: str) -> Iterator[FlatType]:
+    # streams the records without loading the whole file
+    with open(path, "rb") as file:
+        _checkMagic(file.read(len(MAGIC)))
+        while True:
+            header = file.read(_record.size)
+            if len(header) < _record.size or header[:1] != b"T":
+                return
+            _, nodes, count = _record.unpack(header)
+            body = bytearray()
+            for _ in range(count):
+                length = file.read(_name.size)
+                if len(length) < _name.size:
+                    return
+                body += length + file.read(_name.unpack(length)[0])
+            body += file.read(nodes * 9)
+            if len(body) < nodes * 9:
+                return
+            yield decodeRecord(header + body, 0)[0]
+
+
+def readCorpus(path: str) -> Iterator[Type]:
+    return map(unflatten, readFlat(path))
+
+
+class Corpus:
+    # random access over a memory-mapped corpus, records are decoded on access
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        _checkMagic(self.data[:len(MAGIC)])
+        self.offsets = self.readIndex()
+
+    def readIndex(self) -> list[int] | array:
+        data = self.data
+        end = len(data) - len(INDEX_MAGIC) - _offset.size
+        if end >= len(MAGIC) and data[-len(INDEX_MAGIC):] == INDEX_MAGIC:
+            (count,) = _offset.unpack_from(data, end)
+            offsets = array("Q")
+            offsets.frombytes(data[end - count * _offset.size:end])
+            return _littleEndian(offsets)
+
+        # no index, the writer did not finish
+        offsets = []
+        offset = len(MAGIC)
+        while offset < len(data):
+            try:
+                _, following = decodeRecord(data, offset)
+            except (struct.error, ValueError):
+                break
+            if following > len(data):
+                break
+            offsets.append(offset)
+            offset = following
+        return offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def flat(self, i: int) -> FlatType:
+        return decodeRecord(self.data, self.offsets[i])[0]
+
+    def __getitem__(self, i: int) -> Type:
+        return unflatten(self.flat(i))
+
+    def __iter__(self) -> Iterator[Type]:
+        return (self[i] for i in range(len(self)))
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self) -> 'Corpus':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
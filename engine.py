@@ -0,0 +1,391 @@
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
+from model import *
+from nogood import NogoodCache, pairKey
+from stats import SearchStats
+
+Solution = dict[Variable, Variable]
+# gets the solution at the choice point, it holds that state whenever a pairing is taken
+Splitter = Callable[[list[Type], list[Type], Solution], Iterable[list[Constraint]]]
+Propagator = Callable[[list[VariableConstraint], Solution], Solution | None]
+# every completion of a solution by the deferred variable constraints, and their number
+Completer = Callable[[list[VariableConstraint], Solution], Iterable[Solution]]
+LeafCounter = Callable[[list[VariableConstraint], Solution], int]
+# index in the agenda of the constraint to take next
+Ordering = Callable[['Search'], int]
+
+# trail entries, undone in reverse order on backtracking
+POP, PUSH, BIND, DEFER, UNIT, UNIT_TAKEN = range(6)
+
+# pairings nested deeper than this are not checked in isolation
+maxCheckDepth = 16
+
+# the clock is read once every this many steps
+clockInterval = 256
+
+
+class Unknown:
+    def __repr__(self) -> str:
+        return "unknown"
+
+# result of a search that ran out of its budget
+unknown = Unknown()
+
+
+class Budget:
+    # deadline is a time.monotonic() value
+    def __init__(self, maxSteps: int | None = None, deadline: float | None = None):
+        self.maxSteps = maxSteps
+        self.deadline = deadline
+        self.steps = 0
+        self.expired = False
+
+    def spend(self) -> bool:
+        self.steps += 1
+        if self.maxSteps is not None and self.steps > self.maxSteps:
+            self.expired = True
+        elif self.deadline is not None and self.steps % clockInterval == 0 \
+                and time.monotonic() > self.deadline:
+            self.expired = True
+        return not self.expired
+
+    def check(self) -> bool:
+        # reads the clock now, for steps too costly to wait clockInterval of them
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.expired = True
+        return not self.expired
+
+    @staticmethod
+    def of(maxSteps: int | None, deadline: float | None) -> 'Budget | None':
+        if maxSteps is None and deadline is None:
+            return None
+        return Budget(maxSteps, deadline)
+
+
+@dataclass(frozen=True)
+class VariableHandling:
+    # variable members of intersections are set aside and solved together at the end
+    first: Propagator
+    every: Completer | None = None
+    count: LeafCounter | None = None
+
+
+@dataclass(frozen=True)
+class Strategy:
+    split: Splitter
+    # None pairs variable members through the splitter like any other member
+    variables: VariableHandling | None = None
+    # None takes the constraints in list order
+    order: Ordering | None = None
+
+
+def getVarBound(types1: list[Type], types2: list[Type]) -> int | None:
+    varBound = 0
+    for v1, v2 in zip(types1, types2):
+        if isinstance(v1, Variable) and isinstance(v2, Variable):
+            varBound += 1
+        elif not isinstance(v1, Variable) and not isinstance(v2, Variable):
+            return varBound
+        else:
+            return None
+    return varBound
+
+
+class Search:
+    def __init__(
+            self, C: list[Constraint], S: Solution, strategy: Strategy,
+            nogoods: NogoodCache | None = None, budget: Budget | None = None, depth: int = 0,
+            stats: SearchStats | None = None
+        ):
+        self.strategy = strategy
+        self.split = strategy.split
+        self.propagate = strategy.variables.first if strategy.variables is not None else None
+        self.order = strategy.order
+        self.nogoods = nogoods
+        self.budget = budget
+        self.depth = depth
+        self.stats = stats
+        # the last constraint of the agenda is processed first
+        self.agenda: list[Constraint] = list(reversed(C))
+        self.deferred: list[VariableConstraint] = []
+        self.solution: Solution = dict(S)
+        self.images: dict[Variable, Variable] = {b: a for a, b in S.items()}
+        self.trail: list[tuple[int, object]] = []
+        self.choices: list[tuple[int, Iterator[list[Constraint]]]] = []
+        # used by expand to stop at the first choice point
+        self.expanding = False
+        self.pending: Iterator[list[Constraint]] | None = None
+        # for the strategy's own bookkeeping, lives as long as the search
+        self.cache: dict = {}
+        # for orderings: deferred constraints by their variables, and the ones
+        # that were down to one free variable a side when last bound or deferred
+        self.watching = self.order is not None
+        self.watch: defaultdict[Variable, list[int]] = defaultdict(list)
+        self.units: list[int] = []
+
+    def push(self, constraints: list[Constraint]):
+        self.agenda.extend(reversed(constraints))
+        self.trail.append((PUSH, len(constraints)))
+
+    def bind(self, a: Variable, b: Variable) -> bool:
+        if a in self.solution:
+            return self.solution[a] == b
+        if b in self.images:
+            # renaming must stay injective
+            return False
+        self.solution[a] = b
+        self.images[b] = a
+        self.trail.append((BIND, a))
+        if self.watching:
+            for i in self.watch.get(a, []) + self.watch.get(b, []):
+                self.checkUnit(i)
+        if self.stats is not None:
+            self.stats.binds += 1
+            self.stats.emit("bind", a, b)
+        return True
+
+    def defer(self, c: VariableConstraint):
+        self.deferred.append(c)
+        self.trail.append((DEFER, None))
+        if self.watching and isinstance(c, VariableConstraint):
+            i = len(self.deferred) - 1
+            for a in [*c.left, *c.right]:
+                self.watch[a].append(i)
+            self.checkUnit(i)
+
+    def unitPair(self, c: VariableConstraint) -> Constraint | None:
+        # the pair of the free variables of c if there is one on each side
+        left = [a for a in c.left if a not in self.solution]
+        if len(left) != 1:
+            return None
+        right = [b for b in c.right if b not in self.images]
+        if len(right) != 1:
+            return None
+        return Constraint(left[0], right[0])
+
+    def checkUnit(self, i: int):
+        if self.unitPair(self.deferred[i]) is not None: # type: ignore
+            self.units.append(i)
+            self.trail.append((UNIT, None))
+
+    def nextUnit(self) -> Constraint | None:
+        # a deferred constraint down to one free variable a side, binds only
+        # make fewer variables free, so one that is not is dropped until undone
+        while self.units:
+            i = self.units.pop()
+            self.trail.append((UNIT_TAKEN, i))
+            pair = self.unitPair(self.deferred[i]) # type: ignore
+            if pair is not None:
+                return pair
+        return None
+
+    def undo(self, mark: int):
+        while len(self.trail) > mark:
+            op, arg = self.trail.pop()
+            if op == POP:
+                index, c = arg # type: ignore
+                self.agenda.insert(index, c)
+            elif op == PUSH:
+                if arg: del self.agenda[-arg:] # type: ignore
+            elif op == BIND:
+                del self.images[self.solution.pop(arg)] # type: ignore
+            elif op == UNIT:
+                self.units.pop()
+            elif op == UNIT_TAKEN:
+                self.units.append(arg) # type: ignore
+            else:
+                c = self.deferred.pop()
+                if self.watching and isinstance(c, VariableConstraint):
+                    for a in [*c.left, *c.right]:
+                        self.watch[a].pop()
+
+    def branch(self, alternatives: Iterable[list[Constraint]]) -> bool:
+        if self.stats is not None:
+            self.stats.branches += 1
+            self.stats.emit("branch", len(self.choices))
+            alternatives = self.stats.counted(alternatives)
+        if self.nogoods is not None and self.depth < maxCheckDepth:
+            alternatives = self.compatibleAlternatives(alternatives)
+        if self.expanding:
+            self.pending = iter(alternatives)
+            return True
+        self.choices.append((len(self.trail), iter(alternatives)))
+        return self.backtrack()
+
+    def expand(self) -> Iterator[list[Constraint]] | None:
+        # runs the forced steps up to the first choice point and returns
+        # its alternatives without taking any, None if there is no choice
+        self.expanding = True
+        try:
+            while self.agenda and self.pending is None:
+                if not self.step():
+                    return iter(())
+        finally:
+            self.expanding = False
+        return self.pending
+
+    def remaining(self) -> list[Constraint]:
+        # constraints still to solve after the current one, in agenda order
+        return list(reversed(self.agenda)) + self.deferred
+
+    def compatibleAlternatives(self, alternatives: Iterable[list[Constraint]]) -> Iterator[list[Constraint]]:
+        # every alternative looked at costs a step, cached nogoods can rule out
+        # a whole choice point without the search taking one
+        for constraints in alternatives:
+            if self.budget is not None and not self.budget.spend():
+                return
+            if all(map(self.compatible, constraints)):
+                yield constraints
+
+    def compatible(self, c: Constraint) -> bool:
+        # solves the pairing on its own under the current solution,
+        # a failure there rules out every alternative containing it
+        if isinstance(c.left, Variable) or isinstance(c.right, Variable):
+            return True
+        assert self.nogoods is not None
+        key = pairKey(c, self.solution, self.images)
+        result = self.nogoods.get(key)
+        if result is None:
+            pair = Search(
+                [c], self.solution, self.strategy, self.nogoods, self.budget, self.depth + 1, self.stats
+            )
+            solution = pair.run()
+            if solution is unknown:
+                # out of budget, the caller stops at its next step
+                return True
+            result = solution is not None
+            self.nogoods.put(key, result)
+        if not result and self.stats is not None:
+            self.stats.nogoodPrunes += 1
+        return result
+
+    def backtrack(self) -> bool:
+        while self.choices:
+            mark, alternatives = self.choices[-1]
+            self.undo(mark)
+            constraints = next(alternatives, None)
+            if constraints is not None:
+                if self.stats is not None:
+                    self.stats.alternatives += 1
+                    self.stats.emit("alternative", len(self.choices), constraints)
+                self.push(constraints)
+                return True
+            self.choices.pop()
+        return False
+
+    def take(self) -> Constraint:
+        # removes the next constraint from the agenda, undo puts it back in place
+        index = len(self.agenda) - 1 if self.order is None else self.order(self)
+        c = self.agenda.pop(index)
+        self.trail.append((POP, (index, c)))
+        if self.stats is not None:
+            self.stats.constraints += 1
+        return c
+
+    def step(self) -> bool:
+        c = self.take()
+
+        if isinstance(c, VariableConstraint):
+            self.defer(c)
+            return True
+
+        match c.left, c.right:
+            case Variable(_) as a, Variable(_) as b:
+                return self.bind(a, b)
+            case Arrow(l1, r1), Arrow(l2, r2):
+                self.push([Constraint(l1, l2), Constraint(r1, r2)])
+                return True
+            case Intersection(types1), Intersection(types2):
+                if len(types1) != len(types2):
+                    return False
+                if not types1:
+                    return True
+
+                if self.propagate is not None:
+                    varBound = getVarBound(types1, types2)
+                    if varBound is None: return False
+
+                    if varBound != 0:
+                        self.defer(VariableConstraint(types1[:varBound], types2[:varBound])) # type: ignore
+                        if varBound == len(types1):
+                            return True
+                        types1 = types1[varBound:]
+                        types2 = types2[varBound:]
+
+                return self.branch(self.split(types1, types2, self.solution))
+        return False
+
+    def propagateDeferred(self) -> Solution | None:
+        assert self.propagate is not None
+        if self.stats is None:
+            return self.propagate(self.deferred, self.solution)
+        self.stats.propagations += 1
+        with self.stats.phase("propagate"):
+            solution = self.propagate(self.deferred, self.solution)
+        if solution is None:
+            self.stats.propagationFailures += 1
+        self.stats.emit("propagate", solution is not None)
+        return solution
+
+    def leaves(self) -> Iterator[None]:
+        # stops whenever every constraint is paired, the solution and the
+        # deferred constraints of that leaf are read off the search
+        ok = True
+        while True:
+            if self.budget is not None and not self.budget.spend():
+                return
+            if not ok:
+                if self.stats is not None:
+                    self.stats.backtracks += 1
+                    self.stats.emit("backtrack", len(self.choices))
+                if not self.backtrack():
+                    return
+            if self.agenda:
+                ok = self.step()
+                continue
+            yield
+            ok = False
+
+    def expired(self) -> bool:
+        return self.budget is not None and self.budget.expired
+
+    def run(self) -> Solution | Unknown | None:
+        for _ in self.leaves():
+            if self.deferred and self.propagate is not None:
+                solution = self.propagateDeferred()
+                if solution is None:
+                    continue
+                return solution
+            return dict(self.solution)
+        return unknown if self.expired() else None
+
+    def solutions(self) -> Iterator[Solution | Unknown]:
+        # every solution once, then unknown if the budget ran out before the end.
+        # Nothing is kept to skip repeats: different leaves never share a
+        # solution (see count) and the completions of a leaf are different
+        variables = self.strategy.variables
+        complete = variables.every if variables is not None else None
+        assert complete is not None or variables is None
+        for _ in self.leaves():
+            if self.deferred and complete is not None:
+                yield from complete(self.deferred, self.solution)
+            else:
+                yield dict(self.solution)
+        if self.expired():
+            yield unknown
+
+    def count(self) -> int | Unknown:
+        # in a normal form a renaming decides every pairing on its way,
+        # so different leaves never share a solution
+        variables = self.strategy.variables
+        countLeaf = variables.count if variables is not None else None
+        assert countLeaf is not None or variables is None
+        total = 0
+        for _ in self.leaves():
+            if self.deferred and countLeaf is not None:
+                total += countLeaf(self.deferred, self.solution)
+            else:
+                total += 1
+        return unknown if self.expired() else total
@@ -0,0 +1,244 @@
+from array import array
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from functools import cached_property
+from itertools import permutations
+from typing import Generator
+from model import *
+from hashcons import internNode
+from utils import normalForm
+from matching import maximumMatching
+from engine import Search, Strategy, VariableHandling, Solution, Budget, Unknown, unknown
+from stats import SearchStats, timed
+from invariants import rejected
+
+VAR, ARROW, INTER = range(3)
+
+# node indices of the two sides
+FlatConstraint = tuple[int, int]
+# variable members of two intersections, by variable id
+FlatVariableConstraint = tuple[list[int], list[int]]
+
+
+@dataclass(frozen=True, eq=False)
+class FlatType:
+    # nodes in prefix order, the first child of node i is i + 1
+    # and the next sibling of a child c is ends[c]
+    tags: array
+    # variable id for variables, member count for intersections
+    args: array
+    # one past the last node of the subtree
+    ends: array
+    # variable id -> name
+    names: tuple[str, ...]
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FlatType):
+            return NotImplemented
+        return self.tags == other.tags and self.args == other.args and self.names == other.names
+
+    def __hash__(self) -> int:
+        return self.hashValue
+
+    @cached_property
+    def hashValue(self) -> int:
+        # ends follow from tags and args
+        return hash((self.tags.tobytes(), self.args.tobytes(), self.names))
+
+    @property
+    def size(self) -> int:
+        return len(self.tags)
+
+    @cached_property
+    def vars(self) -> frozenset[int]:
+        return frozenset(range(len(self.names)))
+
+    def occurrenceCounts(self) -> Counter[int]:
+        return Counter(a for tag, a in zip(self.tags, self.args) if tag == VAR)
+
+    def children(self, i: int) -> list[int]:
+        tag = self.tags[i]
+        if tag == VAR:
+            return []
+        if tag == ARROW:
+            return [i + 1, self.ends[i + 1]]
+        members = []
+        c = i + 1
+        for _ in range(self.args[i]):
+            members.append(c)
+            c = self.ends[c]
+        return members
+
+    def subtreeSize(self, i: int) -> int:
+        return self.ends[i] - i
+
+
+def flatten(t: Type) -> FlatType:
+    tags, args, ends = array("b"), array("i"), array("i")
+    ids: dict[str, int] = {}
+    # an int on the stack closes the subtree of that node
+    stack: list[Type | int] = [t]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, int):
+            ends[node] = len(tags)
+            continue
+        index = len(tags)
+        ends.append(0)
+        stack.append(index)
+        match node:
+            case Variable(name):
+                tags.append(VAR)
+                args.append(ids.setdefault(name, len(ids)))
+            case Arrow(l, r):
+                tags.append(ARROW)
+                args.append(0)
+                stack += [r, l]
+            case Intersection(types):
+                tags.append(INTER)
+                args.append(len(types))
+                stack += reversed(types)
+    return FlatType(tags, args, ends, tuple(ids))
+
+
+def unflatten(f: FlatType) -> Type:
+    # children come after their parent, so building backwards
+    # leaves the first child on top of the stack
+    variables = [internNode(Variable(name)) for name in f.names]
+    stack: list[Type] = []
+    for i in reversed(range(len(f.tags))):
+        tag = f.tags[i]
+        if tag == VAR:
+            stack.append(variables[f.args[i]])
+        elif tag == ARROW:
+            l = stack.pop()
+            r = stack.pop()
+            stack.append(internNode(Arrow(l, r)))
+        else:
+            members = [stack.pop() for _ in range(f.args[i])]
+            stack.append(internNode(Intersection(members)))
+    assert len(stack) == 1
+    return stack[0]
+
+
+def flatSizeSplit(f: FlatType, g: FlatType, members1: list[int], members2: list[int]) \
+        -> Generator[list[FlatConstraint], None, None]:
+    classes1: defaultdict[int, list[int]] = defaultdict(list)
+    for i in members1:
+        classes1[f.subtreeSize(i)].append(i)
+    classes2: defaultdict[int, list[int]] = defaultdict(list)
+    for j in members2:
+        classes2[g.subtreeSize(j)].append(j)
+
+    if classes1.keys() != classes2.keys():
+        return
+    for size, nodes in classes1.items():
+        if len(nodes) != len(classes2[size]):
+            return
+
+    def getConstraints(sizes: list[int]) -> Generator[list[FlatConstraint], None, None]:
+        if not sizes:
+            yield []
+            return
+        size, *sizes = sizes
+        class1 = classes1[size]
+        for p in permutations(classes2[size]):
+            for constraints in getConstraints(sizes):
+                yield list(zip(class1, p)) + constraints
+
+    yield from getConstraints(sorted(classes1, key=lambda size: len(classes1[size])))
+
+
+def flatPropagation(C: list[FlatVariableConstraint], S: Solution) -> Solution | None:
+    # propagationCase over variable ids
+    taken = set(S.values())
+    leftSigs: defaultdict[int, list[int]] = defaultdict(list)
+    rightSigs: defaultdict[int, list[int]] = defaultdict(list)
+    for i, (left, right) in enumerate(C):
+        right = list(right)
+        for a in left:
+            if a in S:
+                try: right.remove(S[a]) # type: ignore
+                except ValueError: return None
+            else:
+                leftSigs[a].append(i) # type: ignore
+        for b in right:
+            if b in taken: # type: ignore
+                return None
+            rightSigs[b].append(i) # type: ignore
+
+    candidates: defaultdict[tuple[int, ...], list[int]] = defaultdict(list)
+    for b, sig in rightSigs.items():
+        candidates[tuple(sig)].append(b)
+
+    allowed = {a: candidates[tuple(sig)] for a, sig in leftSigs.items()}
+    matching = maximumMatching(allowed)
+    if len(matching) != len(allowed):
+        return None
+    return S | matching # type: ignore
+
+
+class FlatSearch(Search):
+    # the engine's search with node index pairs as constraints,
+    # f and g must be flattened normal forms
+    def __init__(
+            self, f: FlatType, g: FlatType, budget: Budget | None = None, stats: SearchStats | None = None
+        ):
+        strategy = Strategy(lambda m1, m2, S: flatSizeSplit(f, g, m1, m2), VariableHandling(flatPropagation)) # type: ignore
+        super().__init__([(0, 0)], {}, strategy, budget=budget, stats=stats) # type: ignore
+        self.f = f
+        self.g = g
+
+    def step(self) -> bool:
+        c = self.take()
+        f, g = self.f, self.g
+        i, j = c # type: ignore
+        tag = f.tags[i]
+        if tag != g.tags[j] or f.ends[i] - i != g.ends[j] - j:
+            return False
+        if tag == VAR:
+            return self.bind(f.args[i], g.args[j]) # type: ignore
+        if tag == ARROW:
+            self.push([(i + 1, j + 1), (f.ends[i + 1], g.ends[j + 1])]) # type: ignore
+            return True
+
+        if f.args[i] != g.args[j]:
+            return False
+        members1, members2 = f.children(i), g.children(j)
+        # variables come first in a normal form
+        vars1 = [k for k in members1 if f.tags[k] == VAR]
+        vars2 = [k for k in members2 if g.tags[k] == VAR]
+        if len(vars1) != len(vars2):
+            return False
+        if vars1:
+            self.defer(([f.args[k] for k in vars1], [g.args[k] for k in vars2])) # type: ignore
+        if len(vars1) == len(members1):
+            return True
+        return self.branch(self.split(members1[len(vars1):], members2[len(vars2):], self.solution)) # type: ignore
+
+
+def FlatSolve(
+        f: FlatType, g: FlatType, budget: Budget | None = None, stats: SearchStats | None = None
+    ) -> Solution | Unknown | None:
+    return FlatSearch(f, g, budget, stats).run()
+
+
+def compareFlat(
+        t: Type, s: Type, maxSteps: int | None = None, deadline: float | None = None,
+        stats: SearchStats | None = None
+    ) -> Renaming | Unknown | None:
+    with timed(stats, "normalize"):
+        t = normalForm(t)
+        s = normalForm(s)
+    if rejected(t, s, stats):
+        return None
+    f, g = flatten(t), flatten(s)
+
+    with timed(stats, "search"):
+        solution = FlatSolve(f, g, Budget.of(maxSteps, deadline), stats)
+    if solution is None or solution is unknown:
+        return solution
+    return Renaming([[Variable(f.names[a]), Variable(g.names[b])] for a, b in solution.items()]) # type: ignore
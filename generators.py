@@ -0,0 +1,95 @@
+import random
+from type import *
+from utils import randomRename
+from hashcons import intern
+
+collection = list(types.values())
+
+def testType(depth: int, width: int, varsCount: int) -> tuple[Type, Type, Renaming]:
+    vars = [Variable(f"a{i}") for i in range(varsCount)]
+    k = 0
+    types: list[Type] = []
+    for _ in range(width - 1):
+        type = random.choice(collection)
+        type, _ = randomRename(type, vars, unique=False)
+        types.append(type)
+    previous = Intersection(types)
+
+    for i in range(depth):
+        types: list[Type] = []
+        for _ in range(width - 1):
+            type = random.choice(collection)
+            type, _ = randomRename(type, vars, unique=False)
+            types.append(type)
+        types.append(Arrow(previous, vars[k]))
+        k = (k + 1) % varsCount
+        current = Intersection(types)
+        previous = current
+    
+    t = intern(previous)
+    s, r = randomRename(t)
+    s = intern(shuffled(s))
+    return t, s, r
+
+
+def manyVariables(depth: int, width: int) -> tuple[Type, Type, Renaming]:
+    vars = [Variable(f"a{i}") for i in range(width * 2)]
+    previous = Intersection([random.choice(vars) for _ in range(width)])
+
+    k = 0
+    for _ in range(depth):
+        types: list[Type] = [random.choice(vars) for _ in range(width - 1)]
+        types.append(Arrow(previous, vars[k]))
+        k = (k + 1) % len(vars)
+        current = Intersection(types)
+        previous = current
+
+    t = intern(previous)
+    s, r = randomRename(t)
+    s = intern(shuffled(s))
+    return t, s, r
+
+
+def shuffled(t: Type) -> Type:
+    match t:
+        case Variable(_) as a:
+            return a
+        case Arrow(l, r):
+            return Arrow(shuffled(l), shuffled(r))
+        case Intersection(types):
+            types1 = list(map(shuffled, types))
+            random.shuffle(types1)
+            return Intersection(types1)
+    assert False
+
+
+# def manyVariables(depth: int, width: int = 7) -> tuple[Type, Type, Renaming]:
+#     vars = [Variable(f"a{i}") for i in range(width * 2)]
+#     k = 0
+#     types: list[Type] = []
+#     for _ in range(width - 1):
+#         type = random.choice(collection)
+#         type, _ = randomRename(type, vars, unique=False)
+#         types.append(type)
+#     previous = Intersection(types)
+
+#     for i in range(depth):
+#         types: list[Type] = []
+#         sub = random.randint(1, max(width, 4))
+#         for _ in range(width - sub):
+#             type = random.choice(vars)
+#             types.append(type)
+#         for _ in range(sub - 1):
+#             type = random.choice(collection)
+#             type, _ = randomRename(type, vars, unique=False)
+#             types.append(type)
+
+#         types.append(Arrow(previous, vars[k]))
+#         k = (k + 1) % len(vars)
+
+#         current = Intersection(types)
+#         previous = current
+    
+#     t = previous
+#     s, r = randomRename(t)
+#     return t, s, r
@@ -0,0 +1,91 @@
+import threading
+from hashlib import blake2b
+from weakref import WeakValueDictionary
+from model import *
+
+# structure key -> canonical node, children are referenced by id since
+# interned children are kept alive by their interned parents
+_table: WeakValueDictionary[tuple, Type] = WeakValueDictionary()
+# held from the lookup to the insert, so a structure gets one canonical node
+_lock = threading.Lock()
+
+
+def _key(t: Type) -> tuple:
+    match t:
+        case Variable(name):
+            return (Variable, name)
+        case Arrow(l, r):
+            return (Arrow, id(l), id(r))
+        case Intersection(types):
+            return (Intersection, *map(id, types))
+    assert False
+
+
+def internNode(t: Type) -> Type:
+    # children of t must already be interned
+    key = _key(t)
+    node = _table.get(key)
+    if node is not None:
+        return node
+
+    # children are interned, so these only look one level down
+    t.hashValue, t.size, t.depth, t.vars, t.occurrences
+    with _lock:
+        # another thread may have interned the same structure meanwhile,
+        # only the node that gets the slot is marked
+        node = _table.get(key)
+        if node is not None:
+            return node
+        object.__setattr__(t, "_interned", True)
+        _table[key] = t
+    return t
+
+
+def intern(t: Type) -> Type:
+    if t._interned:
+        return t
+
+    done: dict[int, Type] = {}
+    for node in postorder(t, isLeaf=isInterned):
+        if node._interned:
+            done[id(node)] = node
+            continue
+
+        rebuilt = node
+        match node:
+            case Arrow(l, r):
+                l1, r1 = done[id(l)], done[id(r)]
+                if l1 is not l or r1 is not r:
+                    rebuilt = Arrow(l1, r1)
+            case Intersection(types):
+                types1 = [done[id(t)] for t in types]
+                if any(t1 is not t for t1, t in zip(types1, types)):
+                    rebuilt = Intersection(types1)
+        done[id(node)] = internNode(rebuilt)
+
+    return done[id(t)]
+
+
+def isInterned(t: Type) -> bool:
+    return t._interned
+
+
+def internedCount() -> int:
+    return len(_table)
+
+
+# the variable-erased structure as a digest, equal for types equal up to
+# renaming and the same in every process
+def shapeOf(t: Type) -> bytes:
+    return cachedBottomUp(t, "shape", _shape) # type: ignore
+
+
+def _shape(node: Type) -> bytes:
+    match node:
+        case Variable(_):
+            data = b"V"
+        case Arrow(l, r):
+            data = b"A" + l.__dict__["shape"] + r.__dict__["shape"]
+        case Intersection(types):
+            data = b"I" + b"".join(sorted(t.__dict__["shape"] for t in types))
+    return blake2b(data, digest_size=16).digest()
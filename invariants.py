@@ -0,0 +1,97 @@
+from collections import Counter, defaultdict
+from dataclasses import dataclass, fields
+from hashlib import blake2b
+from model import *
+from hashcons import shapeOf
+from stats import SearchStats
+
+
+# compared field by field in this order, the cheap ones first
+@dataclass(frozen=True)
+class Invariants:
+    size: int
+    depth: int
+    varCount: int
+    # sorted occurrence counts of the variables
+    occurrences: tuple[int, ...]
+    # sorted member counts of the intersections
+    arities: tuple[int, ...]
+    # sorted member sizes of the intersections at each nesting level
+    levelSizes: tuple[tuple[int, ...], ...]
+    shape: bytes
+
+
+def occurrenceCounts(t: Type) -> Counter[Variable]:
+    counts: Counter[Variable] = Counter()
+    stack = [t]
+    while stack:
+        match stack.pop():
+            case Variable(_) as a:
+                counts[a] += 1
+            case Arrow(l, r):
+                stack += [l, r]
+            case Intersection(types):
+                stack += types
+    return counts
+
+
+# expects a normal form, the values are the same for types equal up to renaming
+def invariants(t: Type) -> Invariants:
+    if "invariants" in t.__dict__:
+        return t.__dict__["invariants"]
+
+    counts: Counter[Variable] = Counter()
+    arities: list[int] = []
+    levels: defaultdict[int, list[int]] = defaultdict(list)
+    stack = [(t, 0)]
+    while stack:
+        node, level = stack.pop()
+        match node:
+            case Variable(_) as a:
+                counts[a] += 1
+            case Arrow(l, r):
+                stack += [(l, level), (r, level)]
+            case Intersection(types):
+                arities.append(len(types))
+                levels[level] += [m.size for m in types]
+                stack += [(m, level + 1) for m in types]
+
+    inv = Invariants(
+        t.size, t.depth, len(counts),
+        tuple(sorted(counts.values())),
+        tuple(sorted(arities)),
+        tuple(tuple(sorted(levels[k])) for k in range(len(levels))),
+        shapeOf(t)
+    )
+    t.__dict__["invariants"] = inv
+    return inv
+
+
+def bucketKey(t: Type) -> int:
+    # the invariants of a normal form as a 64-bit key that is the same in
+    # every process, for indexes kept on disk
+    inv = invariants(t)
+    fixed = (inv.size, inv.depth, inv.varCount, inv.occurrences, inv.arities, inv.levelSizes)
+    digest = blake2b(repr(fixed).encode() + shapeOf(t), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def mismatch(t: Type, s: Type) -> str | None:
+    # name of the first invariant the normal forms t and s differ in
+    a, b = invariants(t), invariants(s)
+    for f in fields(Invariants):
+        if getattr(a, f.name) != getattr(b, f.name):
+            return f.name
+    return None
+
+
+def rejected(t: Type, s: Type, stats: SearchStats | None = None) -> bool:
+    # the pre-check of the compare functions
+    if stats is None:
+        return mismatch(t, s) is not None
+    with stats.phase("precheck"):
+        reason = mismatch(t, s)
+    if reason is not None:
+        stats.rejected[reason] = stats.rejected.get(reason, 0) + 1
+        stats.emit("reject", reason)
+    return reason is not None
@@ -0,0 +1,196 @@
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from typing import Iterable, Iterator
+from model import *
+from utils import normalForm
+from flat import flatten, unflatten
+from corpus import MAGIC, CorpusError, encodeRecord, decodeRecord
+from invariants import invariants, bucketKey
+from algorithms import compareConstrPropSizeCount
+from batch import Comparison
+
+# a library of normal forms kept in two files that only grow between compactions:
+#   path:       a corpus without its index, the records in the order they were added
+#   path.keys:  magic, sorted entry count (u64), then one entry per record:
+#               bucket key (u64), record offset (u64), entry id, size, depth and
+#               variable count (u32 each)
+# the first entries are sorted by bucket key and searched by bisection, entries
+# added after the last compaction follow in the order they were added and are
+# scanned. Records are written before their entries, so a reader that mapped
+# the files earlier only sees complete entries. One process adds at a time
+KEYS_MAGIC = b"ITK1"
+
+_header = struct.Struct("<4sQ")
+_entry = struct.Struct("<QQIIII")
+
+# unsorted entries add keeps before it compacts
+compactTail = 4096
+
+
+def _keysPath(path: str) -> str:
+    return path + ".keys"
+
+
+def _map(path: str) -> mmap.mmap | None:
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class _Keys:
+    # the bucket keys of the sorted entries, for bisect
+    def __init__(self, data, count: int):
+        self.data = data
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, i: int) -> int:
+        return _entry.unpack_from(self.data, _header.size + i * _entry.size)[0]
+
+
+def _writeKeys(path: str, entries: list[tuple]):
+    # sorted, into a new file that replaces the old one, so readers keep theirs
+    entries.sort(key=lambda e: (e[0], e[2]))
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(_header.pack(KEYS_MAGIC, len(entries)))
+        for entry in entries:
+            file.write(_entry.pack(*entry))
+    os.replace(temporary, path)
+
+
+def _entryOf(t: Type, offset: int, id: int) -> tuple:
+    inv = invariants(t)
+    return bucketKey(t), offset, id, inv.size, inv.depth, inv.varCount
+
+
+def buildIndex(path: str, types: Iterable[Type]) -> int:
+    entries = []
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        for t in types:
+            t = normalForm(t)
+            entries.append(_entryOf(t, file.tell(), len(entries)))
+            file.write(encodeRecord(flatten(t)))
+    _writeKeys(_keysPath(path), entries)
+    return len(entries)
+
+
+class LibraryIndex:
+    # lookups go through read-only maps of the two files, which processes
+    # opening the same index share through the page cache
+    def __init__(self, path: str, compare: Comparison = compareConstrPropSizeCount):
+        self.path = path
+        self.compare = compare
+        self.ids: dict[int, int] | None = None # entry id -> record offset
+        self.open()
+
+    def open(self):
+        self.records = _map(self.path)
+        self.keys = _map(_keysPath(self.path))
+        if self.records is None or self.records[:len(MAGIC)] != MAGIC:
+            raise CorpusError("not a type corpus")
+        if self.keys is None:
+            raise CorpusError("no keys next to the corpus")
+        magic, self.sorted = _header.unpack_from(self.keys)
+        if magic != KEYS_MAGIC:
+            raise CorpusError("not a library index")
+        self.count = (len(self.keys) - _header.size) // _entry.size
+        self.ids = None
+
+    def close(self):
+        for data in (self.records, self.keys):
+            if data is not None:
+                data.close()
+
+    def reload(self):
+        # picks up entries added by other processes
+        self.close()
+        self.open()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def entry(self, i: int) -> tuple:
+        return _entry.unpack_from(self.keys, _header.size + i * _entry.size)
+
+    def record(self, offset: int) -> Type:
+        return unflatten(decodeRecord(self.records, offset)[0])
+
+    def __getitem__(self, id: int) -> Type:
+        if self.ids is None:
+            self.ids = {}
+            for i in range(self.count):
+                _, offset, entryId, *_ = self.entry(i)
+                self.ids[entryId] = offset
+        return self.record(self.ids[id])
+
+    def __iter__(self) -> Iterator[Type]:
+        return (self[id] for id in range(self.count))
+
+    def bucket(self, key: int) -> Iterator[tuple]:
+        i = bisect_left(_Keys(self.keys, self.sorted), key)
+        while i < self.sorted:
+            entry = self.entry(i)
+            if entry[0] != key:
+                break
+            yield entry
+            i += 1
+        for i in range(self.sorted, self.count):
+            entry = self.entry(i)
+            if entry[0] == key:
+                yield entry
+
+    def candidates(self, t: Type) -> Iterator[tuple[int, Type]]:
+        # the entries t can be equivalent to, with their normal forms
+        t = normalForm(t)
+        inv = invariants(t)
+        for _, offset, id, size, depth, varCount in self.bucket(bucketKey(t)):
+            # keys of different invariants can collide
+            if (size, depth, varCount) == (inv.size, inv.depth, inv.varCount):
+                yield id, self.record(offset)
+
+    def matches(self, t: Type) -> Iterator[tuple[int, Renaming]]:
+        # the entries equivalent to t up to renaming, with the renaming
+        t = normalForm(t)
+        for id, s in self.candidates(t):
+            r = self.compare(t, s)
+            if isinstance(r, Renaming):
+                yield id, r
+
+    def add(self, t: Type) -> int:
+        t = normalForm(t)
+        keysPath = _keysPath(self.path)
+        id = (os.path.getsize(keysPath) - _header.size) // _entry.size
+        with open(self.path, "ab") as file:
+            offset = file.tell()
+            file.write(encodeRecord(flatten(t)))
+        with open(keysPath, "ab") as file:
+            file.write(_entry.pack(*_entryOf(t, offset, id)))
+        self.reload()
+        if self.count - self.sorted > compactTail:
+            self.compact()
+        return id
+
+    def compact(self):
+        self.reload()
+        _writeKeys(_keysPath(self.path), [self.entry(i) for i in range(self.count)])
+        self.reload()
+
+    def __getstate__(self) -> dict:
+        # workers reopen the files instead of receiving their contents
+        return {"path": self.path, "compare": self.compare}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state["path"], state["compare"])
+
+    def __enter__(self) -> 'LibraryIndex':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,67 @@
+from typing import Hashable, TypeVar
+
+L = TypeVar("L", bound=Hashable)
+R = TypeVar("R", bound=Hashable)
+
+INF = float("inf")
+
+
+# Hopcroft-Karp, returns a maximum matching as a map from left to right vertices
+def maximumMatching(adjacency: dict[L, list[R]]) -> dict[L, R]:
+    matchL: dict[L, R] = {}
+    matchR: dict[R, L] = {}
+    dist: dict[L, float] = {}
+
+    def layers() -> bool:
+        dist.clear()
+        queue = [u for u in adjacency if u not in matchL]
+        for u in queue:
+            dist[u] = 0
+        found = False
+        for u in queue:
+            for v in adjacency[u]:
+                w = matchR.get(v)
+                if w is None:
+                    found = True
+                elif w not in dist:
+                    dist[w] = dist[u] + 1
+                    queue.append(w)
+        return found
+
+    def augment(root: L) -> bool:
+        path = [root]
+        via: list[R] = []
+        iters = [iter(adjacency[root])]
+        while iters:
+            u = path[-1]
+            for v in iters[-1]:
+                w = matchR.get(v)
+                if w is None:
+                    via.append(v)
+                    for x, y in zip(path, via):
+                        matchL[x] = y
+                        matchR[y] = x
+                    return True
+                if dist.get(w) == dist[u] + 1:
+                    via.append(v)
+                    path.append(w)
+                    iters.append(iter(adjacency[w]))
+                    break
+            else:
+                # no augmenting path through u in this phase
+                dist[u] = INF
+                path.pop()
+                iters.pop()
+                if via: via.pop()
+        return False
+
+    while layers():
+        for u in adjacency:
+            if u not in matchL:
+                augment(u)
+
+    return matchL
+
+
+def hasPerfectMatching(adjacency: dict[L, list[R]]) -> bool:
+    return len(maximumMatching(adjacency)) == len(adjacency)
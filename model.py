@@ -1,42 +1,121 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from abc import ABC, abstractmethod
-from functools import total_ordering
+from functools import total_ordering, cached_property
+from hashlib import blake2b
+from typing import Callable, Iterable, Iterator, Sequence
 
 @total_ordering
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class Type(ABC):
+    # set by hashcons.intern on canonical nodes, see hashcons.py
+    _interned = False
+    # set by utils.normalForm on its results
+    _normal = False
+
     # @abstractmethod
     # def getSymbols(self) -> set[str]: ...
     @abstractmethod
     def __str__() -> str: ...
 
     def __lt__(self, s: 'Type') -> bool:
-        match self, s:
+        return self.sortKey < s.sortKey
+
+    def __eq__(self, other: object) -> bool:
+        if self is other:
+            return True
+        if not isinstance(other, Type):
+            return NotImplemented
+        # structurally equal interned types are the same object
+        if self._interned and other._interned:
+            return False
+        if self.hashValue != other.hashValue:
+            return False
+        match self, other:
             case Variable(a), Variable(b):
-                return a < b
-            case Variable(_), _:
-                return True
+                return a == b
             case Arrow(l1, r1), Arrow(l2, r2):
-                return (l1, r1) < (l2, r2)
-            case Arrow(_, _), Intersection(_):
-                return True
+                return l1 == l2 and r1 == r2
             case Intersection(types1), Intersection(types2):
-                # keyFunc = cmp_to_key(makeCmp(less))
-                # types1.sort()
-                # types2.sort()
-                return types1 < types2
+                return types1 == types2
             case _, _:
                 return False
 
+    def __hash__(self) -> int:
+        return self.hashValue
+
+    def __reduce__(self):
+        # cached properties and the interned/normal flags are not part of the value
+        return self.__class__, tuple(getattr(self, f.name) for f in fields(self))
+
+    @cached_property
+    def hashValue(self) -> int:
+        match self:
+            case Variable(a): return hash((Variable, a))
+            case Arrow(l, r): return hash((Arrow, l, r))
+            case Intersection(types): return hash((Intersection, *types))
+        assert False
+
+    @cached_property
+    def sortKey(self) -> tuple:
+        # orders variables by name before arrows before intersections,
+        # other types by their digest, a flat key so deep types compare
+        # without recursing
+        match self:
+            case Variable(a): return (0, a)
+            case Arrow(_, _): return (1, self.digest)
+            case Intersection(_): return (2, self.digest)
+        assert False
+
+    @cached_property
+    def digest(self) -> bytes:
+        # of the structure and the names, the same in every process
+        match self:
+            case Variable(a): data = b"V" + a.encode()
+            case Arrow(l, r): data = b"A" + l.digest + r.digest
+            case Intersection(types): data = b"I" + b"".join(t.digest for t in types)
+        return blake2b(data, digest_size=16).digest()
+
+    @cached_property
+    def size(self) -> int:
+        match self:
+            case Variable(_): return 1
+            case Arrow(l, r): return 1 + l.size + r.size
+            case Intersection(types): return 1 + sum(t.size for t in types)
+        assert False
+
+    @cached_property
+    def depth(self) -> int:
+        match self:
+            case Variable(_): return 1
+            case Arrow(l, r): return 1 + max(l.depth, r.depth)
+            case Intersection(types): return 1 + max((t.depth for t in types), default=0)
+        assert False
 
-@dataclass(frozen=True)
+    @cached_property
+    def vars(self) -> frozenset['Variable']:
+        match self:
+            case Variable(_): return frozenset([self])
+            case Arrow(l, r): return l.vars | r.vars
+            case Intersection(types): return frozenset().union(*(t.vars for t in types))
+        assert False
+
+    @cached_property
+    def occurrences(self) -> int:
+        match self:
+            case Variable(_): return 1
+            case Arrow(l, r): return l.occurrences + r.occurrences
+            case Intersection(types): return sum(t.occurrences for t in types)
+        assert False
+
+
+@dataclass(frozen=True, eq=False)
 class Variable(Type):
     name: str
 
     def __str__(self):
         return self.name
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class Intersection(Type):
     types: list[Type]
 
@@ -51,7 +130,7 @@ class Intersection(Type):
                 strs.append(f"({t})")
         return r" /\ ".join(strs)
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class Arrow(Type):
     left: Type
     right: Type
@@ -73,6 +152,37 @@ class Arrow(Type):
         #         strRight = a
         return f"{strLeft} -> {strRight}"
 
+def postorder(*roots: Type, isLeaf: Callable[[Type], bool] | None = None) -> Iterator[Type]:
+    # every node under roots once, children before their parents and left
+    # to right, nodes isLeaf holds for come without their children.
+    # An explicit stack, so deep types do not hit the recursion limit
+    seen: set[int] = set()
+    stack: list[tuple[Type, bool]] = [(t, False) for t in reversed(roots)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in seen:
+            continue
+        if expanded or (isLeaf is not None and isLeaf(node)):
+            seen.add(id(node))
+            yield node
+            continue
+        stack.append((node, True))
+        match node:
+            case Arrow(l, r):
+                stack += [(r, False), (l, False)]
+            case Intersection(types):
+                stack += [(t, False) for t in reversed(types)]
+
+def cachedBottomUp(t: Type, attr: str, combine: Callable[[Type], object]):
+    # the value of attr on t, kept in the __dict__ of every node under it,
+    # combine works out a node's from the values its children have already
+    if attr in t.__dict__:
+        return t.__dict__[attr]
+    for node in postorder(t, isLeaf=lambda n: attr in n.__dict__):
+        if attr not in node.__dict__:
+            node.__dict__[attr] = combine(node)
+    return t.__dict__[attr]
+
 @dataclass
 class Constraint:
     left: Type
@@ -99,37 +209,86 @@ class VariableConstraint(Constraint):
         strRight = ", ".join(map(str, self.right))
         return f"[{strLeft}] = [{strRight}]"
 
-@dataclass()
 class Renaming:
-    # subs: dict[Variable, Variable]
-    subs: list[list[Variable]]
+    # forward holds the map, backward the preimages of every image in the
+    # order they were set, a map that is not injective is allowed
+    def __init__(self, subs: Iterable[Sequence[Variable]] | dict[Variable, Variable] = ()):
+        self.forward: dict[Variable, Variable] = {}
+        self.backward: dict[Variable, list[Variable]] = {}
+        pairs = subs.items() if isinstance(subs, dict) else subs
+        for a, b in pairs:
+            self.set(a, b)
+
+    def set(self, a: Variable, b: Variable):
+        old = self.forward.get(a)
+        if old is not None:
+            preimages = self.backward[old]
+            preimages.remove(a)
+            if not preimages:
+                del self.backward[old]
+        self.forward[a] = b
+        self.backward.setdefault(b, []).append(a)
+
+    @property
+    def subs(self) -> tuple[tuple[Variable, Variable], ...]:
+        # read-only, changes go through set, so old code appending to it fails
+        return tuple(self.forward.items())
+
+    def items(self):
+        return self.forward.items()
+
+    def __len__(self) -> int:
+        return len(self.forward)
+
+    @property
+    def isBijective(self) -> bool:
+        return len(self.backward) == len(self.forward)
 
     def inverse(self, b: Variable) -> Variable | None:
-        for (k, v) in self.subs:
-            if b == v: return k
-        return None
+        preimages = self.backward.get(b)
+        return preimages[0] if preimages else None
 
     def get(self, a: Variable, default: Variable | None = None) -> Variable | None:
-        for (k, v) in self.subs:
-            if a == k: return v
-        return default
+        return self.forward.get(a, default)
 
-    def __eq__(self, other: 'Renaming') -> bool:
-        for k, v in self.subs:
-            if other.get(k) != v:
-                return False
-        return len(self.subs) == len(other.subs)
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Renaming):
+            return NotImplemented
+        return self.forward == other.forward
 
-    def applyTo(self, t: Type) -> Type:
-        match t:
-            case Variable(_) as a:
-                return self.get(a, default=a) # type: ignore
-            case Intersection(types):
-                return Intersection([self.applyTo(t) for t in types])
-            case Arrow(l, r):
-                return Arrow(self.applyTo(l), self.applyTo(r))
-            case _:
-                return t
+    def __repr__(self) -> str:
+        return f"Renaming(subs={self.subs!r})"
 
     def __str__(self) -> str:
-        return "{" + r", ".join([f"{k} -> {v}" for k, v in sorted(self.subs)]) + "}"
+        return "{" + r", ".join([f"{k} -> {v}" for k, v in sorted(self.forward.items())]) + "}"
+
+    def applyTo(self, t: Type) -> Type:
+        changed = {a for a, b in self.forward.items() if a != b}
+        if not changed:
+            return t
+
+        # subtrees without renamed variables are kept, shared ones are done once
+        def kept(node: Type) -> bool:
+            return node._interned and node.vars.isdisjoint(changed)
+
+        done: dict[int, Type] = {}
+        for node in postorder(t, isLeaf=kept):
+            if kept(node):
+                done[id(node)] = node
+                continue
+
+            renamed = node
+            match node:
+                case Variable(_) as a:
+                    renamed = self.forward.get(a, a)
+                case Arrow(l, r):
+                    l1, r1 = done[id(l)], done[id(r)]
+                    if l1 is not l or r1 is not r:
+                        renamed = Arrow(l1, r1)
+                case Intersection(types):
+                    types1 = [done[id(t)] for t in types]
+                    if any(t1 is not t for t1, t in zip(types1, types)):
+                        renamed = Intersection(types1)
+            done[id(node)] = renamed
+
+        return done[id(t)]
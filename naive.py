@@ -1,54 +1,126 @@
+from collections import defaultdict
+from typing import Iterator
 from model import *
 from utils import *
+from engine import Budget, Unknown, unknown
+from invariants import rejected
 
+Profile = tuple[int, ...]
 
-def getRenaming(sVars: list[Variable], current: Renaming, index: int, stop: int):
-    if index == stop:
-        yield current
-        return
 
-    init = sVars[0]
-    for v in sVars:
-        current.subs[index][1] = v
-        yield from getRenaming(sVars, current, index + 1, stop)
+def getProfiles(t: Type) -> dict[Variable, Profile]:
+    # sorted depths of the occurrences of each variable, their number included
+    depths: defaultdict[Variable, list[int]] = defaultdict(list)
+    stack = [(t, 0)]
+    while stack:
+        node, depth = stack.pop()
+        match node:
+            case Variable(_) as a:
+                depths[a].append(depth)
+            case Arrow(l, r):
+                stack += [(l, depth + 1), (r, depth + 1)]
+            case Intersection(types):
+                stack += [(m, depth + 1) for m in types]
+    return {a: tuple(sorted(ds)) for a, ds in depths.items()}
 
-        for i in range(index + 1, stop):
-            current.subs[i][1] = init
 
-def checkRenaming(s: Renaming, sVars: list[Variable]) -> bool:
-    for b in sVars:
-        if s.inverse(b) is None:
-            return False
-    return True
+def getSubterms(t: Type) -> dict[int, Type]:
+    nodes: dict[int, Type] = {}
+    stack = [t]
+    while stack:
+        node = stack.pop()
+        if id(node) in nodes:
+            continue
+        nodes[id(node)] = node
+        match node:
+            case Arrow(l, r):
+                stack += [l, r]
+            case Intersection(types):
+                stack += types
+    return nodes
+
+
+def getCheckpoints(t: Type, order: list[Variable]) -> list[list[Type]]:
+    # subterms to check once order[k] is assigned: those whose variables are all
+    # assigned by then, leaving out the ones inside a subterm checked at the same step
+    position = {a: i for i, a in enumerate(order)}
+    nodes = getSubterms(t)
+    steps = {k: max((position[a] for a in node.vars), default=-1) for k, node in nodes.items()}
+    covered: set[int] = set()
+    for k, node in nodes.items():
+        match node:
+            case Arrow(l, r): children = [l, r]
+            case Intersection(types): children = types
+            case _: children = []
+        for child in children:
+            if steps[id(child)] == steps[k]:
+                covered.add(id(child))
+
+    checkpoints: list[list[Type]] = [[] for _ in order]
+    for k, node in nodes.items():
+        if k not in covered and steps[k] >= 0 and not isinstance(node, Variable):
+            checkpoints[steps[k]].append(node)
+    return checkpoints
+
+
+def getRenaming(
+        order: list[Variable], candidates: dict[Variable, list[Variable]], checkpoints: list[list[Type]],
+        targets: set[Type], budget: Budget | None
+    ) -> Iterator[Renaming]:
+    # bijections only, every completed subterm must map onto a subterm of s
+    current = Renaming()
+    used: set[Variable] = set()
+
+    def assign(index: int) -> Iterator[Renaming]:
+        if index == len(order):
+            yield current
+            return
+        a = order[index]
+        for b in candidates[a]:
+            if b in used:
+                continue
+            if budget is not None and not budget.spend():
+                return
+            current.set(a, b)
+            if all(normalForm(current.applyTo(u)) in targets for u in checkpoints[index]):
+                used.add(b)
+                yield from assign(index + 1)
+                used.discard(b)
+            if budget is not None and budget.expired:
+                return
 
-def naiveComparison(t: Type, s: Type) -> Renaming | None:
+    return assign(0)
+
+
+def naiveComparison(
+        t: Type, s: Type, maxSteps: int | None = None, deadline: float | None = None
+    ) -> Renaming | Unknown | None:
+    budget = Budget.of(maxSteps, deadline)
     t = normalForm(t)
     s = normalForm(s)
+    if rejected(t, s):
+        return None
 
-    tVars = getVars(t)
-    sVars = getVars(s)
-
-    if not sVars: # nothing to match against
-        if t == s:
-            return Renaming([])
+    tProfiles = getProfiles(t)
+    sProfiles = getProfiles(s)
+    if len(tProfiles) != len(sProfiles):
         return None
-    
-    sVarsList = list(sVars)
-    init = sVarsList[0]
-    current = Renaming([[a, init] for a in tVars])
-    g = getRenaming(sVarsList, current, 0, len(tVars))
-
-    # switch comments to choose from bijections
-    for renaming in g:
-    # renaming = Renaming([[a, init] for a in tVars])
-    # for p in itertools.permutations(sVarsList):
-    #     for i in range(len(renaming.subs)):
-    #         renaming.subs[i][1] = p[i]
-        if not checkRenaming(renaming, sVarsList):
-            continue
+    if not tProfiles:
+        return Renaming() if t == s else None
+
+    # a variable can only go to one with the same occurrence depths
+    byProfile: defaultdict[Profile, list[Variable]] = defaultdict(list)
+    for b, profile in sProfiles.items():
+        byProfile[profile].append(b)
+    candidates = {a: byProfile[profile] for a, profile in tProfiles.items()}
+    order = sorted(candidates, key=lambda a: (len(candidates[a]), a))
+
+    checkpoints = getCheckpoints(t, order)
+    targets = set(getSubterms(s).values())
+    for renaming in getRenaming(order, candidates, checkpoints, targets, budget):
+        if normalForm(renaming.applyTo(t)) == s:
+            return Renaming(dict(renaming.items()))
 
-        t1 = normalForm(renaming.applyTo(t))
-        if t1 == s:
-            return renaming
-    
+    if budget is not None and budget.expired:
+        return unknown
     return None
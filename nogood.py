@@ -0,0 +1,41 @@
+from collections import OrderedDict
+from model import *
+
+PairKey = tuple[Type, Type, frozenset, frozenset]
+
+
+def pairKey(c: Constraint, S: dict[Variable, Variable], images: dict[Variable, Variable]) -> PairKey:
+    # only bindings of the pair's own variables can change whether it is solvable
+    t1, t2 = c.left, c.right
+    bound = frozenset((a, S[a]) for a in t1.vars if a in S)
+    blocked = frozenset(b for b in t2.vars if b in images and images[b] not in t1.vars)
+    return t1, t2, bound, blocked
+
+
+class NogoodCache:
+    def __init__(self, maxSize: int = 100000):
+        self.maxSize = maxSize
+        self.entries: OrderedDict[PairKey, bool] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: PairKey) -> bool | None:
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, key: PairKey, compatible: bool):
+        self.entries[key] = compatible
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    @property
+    def nogoods(self) -> int:
+        return sum(not ok for ok in self.entries.values())
+
+    def __str__(self) -> str:
+        return f"hits: {self.hits}, misses: {self.misses}, nogoods: {self.nogoods}/{len(self.entries)}"
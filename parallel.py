@@ -0,0 +1,166 @@
+import os
+import queue
+from itertools import islice
+from multiprocessing import Pool
+from model import *
+from hashcons import internNode
+from utils import normalForm
+from engine import Search, Solution, Strategy, Budget, Unknown, unknown
+from algorithms import solvers
+from invariants import rejected
+
+# node table entries: (0, name), (1, left, right), (2, *members),
+# children refer to earlier entries, so shared subterms are sent once
+NodeTable = list[tuple]
+PackedConstraint = tuple[bool, object, object]
+
+# branches sent to a worker at once
+chunkSize = 32
+
+
+def packTypes(types: list[Type]) -> tuple[NodeTable, dict[int, int]]:
+    table: NodeTable = []
+    index: dict[int, int] = {}
+    for node in postorder(*types):
+        match node:
+            case Variable(name):
+                entry = (0, name)
+            case Arrow(l, r):
+                entry = (1, index[id(l)], index[id(r)])
+            case Intersection(members):
+                entry = (2, *(index[id(t)] for t in members))
+        index[id(node)] = len(table)
+        table.append(entry) # type: ignore
+    return table, index
+
+
+def unpackTypes(table: NodeTable) -> list[Type]:
+    nodes: list[Type] = []
+    for tag, *args in table:
+        match tag:
+            case 0:
+                node = Variable(args[0])
+            case 1:
+                node = Arrow(nodes[args[0]], nodes[args[1]])
+            case _:
+                node = Intersection([nodes[i] for i in args])
+        nodes.append(internNode(node))
+    return nodes
+
+
+def packConstraints(C: list[Constraint], index: dict[int, int]) -> list[PackedConstraint]:
+    packed: list[PackedConstraint] = []
+    for c in C:
+        if isinstance(c, VariableConstraint):
+            packed.append((True, [index[id(a)] for a in c.left], [index[id(b)] for b in c.right]))
+        else:
+            packed.append((False, index[id(c.left)], index[id(c.right)]))
+    return packed
+
+
+def unpackConstraints(packed: list[PackedConstraint], nodes: list[Type]) -> list[Constraint]:
+    C: list[Constraint] = []
+    for isVariable, left, right in packed:
+        if isVariable:
+            C.append(VariableConstraint([nodes[i] for i in left], [nodes[i] for i in right])) # type: ignore
+        else:
+            C.append(Constraint(nodes[left], nodes[right])) # type: ignore
+    return C
+
+
+# state of a worker process, set once by initWorker
+problem: tuple[list[Type], list[Constraint], Solution, Strategy, Budget | None] | None = None
+
+# reply of a worker whose budget ran out
+UNKNOWN = "unknown"
+
+
+def initWorker(
+        solver: str, table: NodeTable, rest: list[PackedConstraint], solution: list[tuple[str, str]],
+        maxSteps: int | None, deadline: float | None
+    ):
+    global problem
+    nodes = unpackTypes(table)
+    S = {Variable(a): Variable(b) for a, b in solution}
+    # every worker gets the whole step budget
+    problem = nodes, unpackConstraints(rest, nodes), S, solvers[solver], Budget.of(maxSteps, deadline)
+
+
+def solveChunk(chunk: list[list[PackedConstraint]]) -> list[tuple[str, str]] | str | None:
+    assert problem is not None
+    nodes, rest, S, strategy, budget = problem
+    for branch in chunk:
+        solution = Search(unpackConstraints(branch, nodes) + rest, S, strategy, budget=budget).run()
+        if solution is unknown:
+            return UNKNOWN
+        if solution is not None:
+            return [(a.name, b.name) for a, b in solution.items()] # type: ignore
+    return None
+
+
+def parallelSolve(
+        C: list[Constraint], S: Solution, solver: str = "constrPropSizeCount", workers: int | None = None,
+        maxSteps: int | None = None, deadline: float | None = None
+    ) -> Solution | Unknown | None:
+    search = Search(C, S, solvers[solver], budget=Budget.of(maxSteps, deadline))
+    alternatives = search.expand()
+    if alternatives is None:
+        return search.run()
+
+    # every constraint the branches refer to is built from subterms of C
+    roots: list[Type] = []
+    for c in C:
+        if isinstance(c, VariableConstraint):
+            roots += c.left + c.right # type: ignore
+        else:
+            roots += [c.left, c.right]
+    table, index = packTypes(roots)
+    rest = packConstraints(search.remaining(), index)
+    solution = [(a.name, b.name) for a, b in search.solution.items()]
+    workers = workers or os.cpu_count() or 1
+    results: queue.Queue = queue.Queue()
+
+    expired = False
+    with Pool(workers, initWorker, (solver, table, rest, solution, maxSteps, deadline)) as pool:
+        def submit() -> bool:
+            chunk = [packConstraints(cs, index) for cs in islice(alternatives, chunkSize)] # type: ignore
+            if not chunk:
+                return False
+            pool.apply_async(solveChunk, (chunk,), callback=results.put, error_callback=results.put)
+            return True
+
+        # keeps every worker busy without materializing all the branches
+        running = 0
+        while running < 2 * workers and submit():
+            running += 1
+
+        while running:
+            result = results.get()
+            running -= 1
+            if isinstance(result, BaseException):
+                raise result
+            if result == UNKNOWN:
+                expired = True
+                continue
+            if result is not None:
+                # leaving the pool terminates the workers still searching
+                return {Variable(a): Variable(b) for a, b in result}
+            if not expired and submit():
+                running += 1
+
+    return unknown if expired else None
+
+
+def compareParallel(
+        t: Type, s: Type, solver: str = "constrPropSizeCount", workers: int | None = None,
+        maxSteps: int | None = None, deadline: float | None = None
+    ) -> Renaming | Unknown | None:
+    t = normalForm(t)
+    s = normalForm(s)
+    if rejected(t, s):
+        return None
+
+    solution = parallelSolve([Constraint(t, s)], {}, solver, workers, maxSteps, deadline)
+    if solution is None or solution is unknown:
+        return solution
+    return Renaming(solution) # type: ignore
@@ -0,0 +1,110 @@
+import re
+from model import *
+from hashcons import internNode
+
+# printed syntax of the types, the inverse of their __str__:
+#   type   := atom '->' type | member ('/\' member)+ | '(' type ')' | name | 'ω'
+#   atom   := name | 'ω' | '(' type ')'
+#   member := name | '(' type ')'
+# the printer parenthesizes arrow lefts and non-variable members itself, so only
+# a group standing for a whole type or an arrow right is a singleton intersection.
+# A singleton intersection of a variable prints as the bare variable and is
+# parsed back as the variable.
+
+_token = re.compile(r"\s*(->|/\\|ω|\(|\)|[^\s()/\\ω-][^\s()/\\ω>-]*)")
+
+NAME, OMEGA, GROUP = range(3)
+
+
+class ParseError(ValueError):
+    pass
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        m = _token.match(text, position)
+        if m is None:
+            raise ParseError(f"unexpected {text[position:].lstrip()[:10]!r} at {position}")
+        tokens.append(m.group(1))
+        position = m.end()
+    return tokens
+
+
+class _Frame:
+    # a type being parsed, opened by a parenthesis or the start of the text
+    def __init__(self):
+        self.lefts: list[Type] = []
+        self.members: list[Type] | None = None
+
+
+def _asWhole(kind: int, value: Type) -> Type:
+    if kind == GROUP:
+        return internNode(Intersection([value]))
+    return value
+
+
+def _close(frame: _Frame, kind: int, value: Type) -> Type:
+    if frame.members is not None:
+        if kind == OMEGA:
+            raise ParseError("ω as an intersection member")
+        result = internNode(Intersection(frame.members + [value]))
+    else:
+        result = _asWhole(kind, value)
+    for left in reversed(frame.lefts):
+        result = internNode(Arrow(left, result))
+    return result
+
+
+def parseType(text: str) -> Type:
+    tokens = tokenize(text)
+    frames = [_Frame()]
+    position = 0
+
+    def advance() -> str | None:
+        nonlocal position
+        if position == len(tokens):
+            return None
+        position += 1
+        return tokens[position - 1]
+
+    while True:
+        # a primary
+        token = advance()
+        if token == "(":
+            frames.append(_Frame())
+            continue
+        if token is None or token in ("->", "/\\", ")"):
+            raise ParseError(f"expected a type at token {position}, got {token!r}")
+        kind, value = (OMEGA, internNode(Intersection([]))) if token == "ω" \
+            else (NAME, internNode(Variable(token)))
+
+        # what follows it, closing groups until something else comes
+        while True:
+            frame = frames[-1]
+            token = advance()
+            if token == "->":
+                if frame.members is not None:
+                    raise ParseError(f"unparenthesized intersection left of -> at token {position}")
+                frame.lefts.append(value)
+                break
+            if token == "/\\":
+                if kind == OMEGA:
+                    raise ParseError("ω as an intersection member")
+                if frame.members is None:
+                    frame.members = []
+                frame.members.append(value)
+                break
+            if token == ")":
+                if len(frames) == 1:
+                    raise ParseError(f"unbalanced ) at token {position}")
+                frames.pop()
+                kind, value = GROUP, _close(frame, kind, value)
+                continue
+            if token is None:
+                if len(frames) != 1:
+                    raise ParseError("missing )")
+                return _close(frame, kind, value)
+            raise ParseError(f"unexpected {token!r} at token {position}")
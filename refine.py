@@ -0,0 +1,123 @@
+from collections import defaultdict
+from hashlib import blake2b
+from itertools import permutations
+from typing import Generator
+from model import *
+from hashcons import shapeOf
+
+# variable -> id of the positions it occurs at in a type
+Occurrences = dict[Variable, bytes]
+
+# the ids are digests, so equal occurrence structures get the same id
+# without a table of the ones seen
+_leaf = blake2b(b"L", digest_size=16).digest()
+_absent = bytes(16)
+
+
+def occurrences(t: Type) -> Occurrences:
+    # the ids are built bottom-up and kept on the nodes, so every subterm is
+    # worked out once however many intersections it is refined in.
+    # An id stands for the left and right ids under an arrow and for the
+    # sorted member ids under an intersection, equal ids mean equal
+    # occurrence paths, with members of an intersection told apart
+    return cachedBottomUp(t, "occurrenceIds", _occurrenceIds) # type: ignore
+
+
+def _occurrenceIds(node: Type) -> Occurrences:
+    match node:
+        case Variable(_):
+            return {node: _leaf}
+        case Arrow(l, r):
+            left, right = l.__dict__["occurrenceIds"], r.__dict__["occurrenceIds"]
+            return {
+                a: blake2b(b"A" + left.get(a, _absent) + right.get(a, _absent), digest_size=16).digest()
+                for a in left.keys() | right.keys()
+            }
+        case Intersection(types):
+            members: defaultdict[Variable, list[bytes]] = defaultdict(list)
+            for m in types:
+                for a, i in m.__dict__["occurrenceIds"].items():
+                    members[a].append(i)
+            return {
+                a: blake2b(b"I" + b"".join(sorted(ms)), digest_size=16).digest()
+                for a, ms in members.items()
+            }
+    assert False
+
+
+def refineColors(types1: list[Type], types2: list[Type]) -> tuple[list[int], list[int]]:
+    occs = [[occurrences(t) for t in types] for types in (types1, types2)]
+    memberSigs: dict[tuple, int] = {}
+    varSigs: dict[tuple, int] = {}
+
+    memberColors = [
+        [memberSigs.setdefault((shapeOf(t), *sorted(occ.values())), len(memberSigs))
+         for t, occ in zip(types, side)]
+        for types, side in zip((types1, types2), occs)
+    ]
+    if all(len(set(colors)) == len(colors) for colors in memberColors):
+        # every member is alone in its class already
+        return memberColors[0], memberColors[1]
+    varColors = [{a: 0 for occ in side for a in occ} for side in occs]
+    classes = 0
+
+    while True:
+        # colours of a variable come from the members it occurs in and vice versa
+        newVarColors = []
+        for side, colors, vars in zip(occs, memberColors, varColors):
+            contexts: defaultdict[Variable, list[tuple]] = defaultdict(list)
+            for occ, color in zip(side, colors):
+                for a, paths in occ.items():
+                    contexts[a].append((color, paths))
+            newVarColors.append({
+                a: varSigs.setdefault((vars[a], *sorted(contexts[a])), len(varSigs))
+                for a in vars
+            })
+
+        newMemberColors = [
+            [memberSigs.setdefault(
+                (color, *sorted((vars[a], paths) for a, paths in occ.items())),
+                len(memberSigs))
+             for occ, color in zip(side, colors)]
+            for side, colors, vars in zip(occs, memberColors, varColors)
+        ]
+
+        memberColors, varColors = newMemberColors, newVarColors
+        refined = sum(len(set(colors)) for colors in memberColors) \
+            + sum(len(set(vars.values())) for vars in varColors)
+        if refined == classes:
+            return memberColors[0], memberColors[1]
+        classes = refined
+
+
+def refineSplit(
+        types1: list[Type], types2: list[Type], S: dict[Variable, Variable] | None = None
+    ) -> Generator[list[Constraint], None, None]:
+    colors1, colors2 = refineColors(types1, types2)
+
+    classes1: defaultdict[int, list[Type]] = defaultdict(list)
+    for t, c in zip(types1, colors1):
+        classes1[c].append(t)
+    classes2: defaultdict[int, list[Type]] = defaultdict(list)
+    for t, c in zip(types2, colors2):
+        classes2[c].append(t)
+
+    if classes1.keys() != classes2.keys():
+        return
+    for c, types in classes1.items():
+        if len(types) != len(classes2[c]):
+            return
+
+    def getConstraints(colors: list[int]) -> Generator[list[Constraint], None, None]:
+        if not colors:
+            yield []
+            return
+        color, *colors = colors
+        class1 = classes1[color]
+        for p in permutations(classes2[color]):
+            for constraints in getConstraints(colors):
+                yield [Constraint(t1, t2) for t1, t2 in zip(class1, p)] \
+                    + constraints
+
+    # smallest classes first, so the cheap choices are the outer loops
+    yield from getConstraints(sorted(classes1, key=lambda c: len(classes1[c])))
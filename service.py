@@ -0,0 +1,352 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from typing import Callable
+from model import *
+from utils import normalForm
+from parse import parseType, ParseError
+from engine import unknown
+from algorithms import compare, compareOrganized, solvers
+from libindex import LibraryIndex
+from stats import percentile
+
+# JSON lines, one request per line, answered as soon as it is solved, so
+# answers can come out of order and carry the id of their request:
+#   {"id": 1, "op": "compare", "t": "a -> b", "s": "c -> d"}
+#   {"id": 2, "op": "compare", "t": "a -> b", "library": 17, "algorithm": "ordered"}
+#   {"id": 3, "op": "match", "t": "a -> b", "maxSteps": 10000, "timeout": 0.5}
+#   {"id": 4, "op": "metrics"}
+# compare answers {"id", "result": "renaming" | "none" | "unknown", "renaming", "ms"},
+# match answers {"id", "matches": [{"entry", "renaming"}], "unknown", "ms"},
+# a request that fails answers {"id", "error"}. Budgets are per request,
+# the timeout in seconds counts from its arrival.
+# Compare requests against the same s or library entry that arrive within
+# batchWindow go to a worker together, which prepares that type once
+
+# seconds a group waits for more requests
+batchWindow = 0.002
+# parsed and normalized types each worker keeps
+typeCacheSize = 4096
+# latencies kept for the metrics of each op
+latencyWindow = 10000
+
+Comparison = Callable[..., Renaming | None]
+
+comparisons: dict[str, Comparison] = {
+    **{name: partial(compare, strategy=strategy) for name, strategy in solvers.items()},
+    "organized": compareOrganized,
+}
+
+
+class RequestError(ValueError):
+    pass
+
+
+# worker state, set up once per process
+_library: LibraryIndex | None = None
+_types: OrderedDict[str | int, Type] = OrderedDict()
+
+
+def openLibrary(path: str | None):
+    global _library
+    _library = LibraryIndex(path) if path is not None else None
+
+
+def getType(key: str | int) -> Type:
+    # a type text or a library entry id, normalized
+    if key in _types:
+        _types.move_to_end(key)
+        return _types[key]
+    if isinstance(key, int):
+        if _library is None:
+            raise RequestError("the service has no library")
+        if not 0 <= key < len(_library):
+            raise RequestError(f"no library entry {key}")
+        t = normalForm(_library[key])
+    else:
+        t = normalForm(parseType(key))
+    _types[key] = t
+    if len(_types) > typeCacheSize:
+        _types.popitem(last=False)
+    return t
+
+
+def renamingJson(r: Renaming) -> dict[str, str]:
+    return {a.name: b.name for a, b in r.items()}
+
+
+def errorText(e: Exception) -> str:
+    if isinstance(e, (ParseError, RequestError)):
+        return str(e)
+    return f"{type(e).__name__}: {e}"
+
+
+def solveGroup(s: str | int, items: list[tuple[str, str, int | None, float | None]]) -> list[dict]:
+    # compares every t of items against the same s, a failing item only
+    # answers its own request, batching never changes another one's result
+    answers = []
+    try:
+        target = getType(s)
+    except Exception as e:
+        return [{"error": errorText(e)}] * len(items)
+    for t, algorithm, maxSteps, deadline in items:
+        try:
+            r = comparisons[algorithm](getType(t), target, maxSteps=maxSteps, deadline=deadline)
+        except Exception as e:
+            answers.append({"error": errorText(e)})
+            continue
+        if r is None:
+            answers.append({"result": "none"})
+        elif r is unknown:
+            answers.append({"result": "unknown"})
+        else:
+            answers.append({"result": "renaming", "renaming": renamingJson(r)}) # type: ignore
+    return answers
+
+
+def matchLibrary(t: str, algorithm: str, maxSteps: int | None, deadline: float | None) -> dict:
+    if _library is None:
+        return {"error": "the service has no library"}
+    try:
+        t1 = getType(t)
+    except Exception as e:
+        return {"error": errorText(e)}
+    matches = []
+    unknowns = 0
+    for id, s in _library.candidates(t1):
+        r = comparisons[algorithm](t1, s, maxSteps=maxSteps, deadline=deadline)
+        if r is unknown:
+            unknowns += 1
+        elif r is not None:
+            matches.append({"entry": id, "renaming": renamingJson(r)}) # type: ignore
+    return {"matches": matches, "unknown": unknowns}
+
+
+class Metrics:
+    def __init__(self):
+        self.latencies: dict[str, deque[float]] = {}
+        self.counts: dict[str, int] = {}
+        self.errors = 0
+        self.unknowns = 0
+        self.batches = 0
+        self.batched = 0 # compare requests sent in those batches
+
+    def record(self, op: str, ms: float, answer: dict):
+        self.counts[op] = self.counts.get(op, 0) + 1
+        self.latencies.setdefault(op, deque(maxlen=latencyWindow)).append(ms)
+        if "error" in answer:
+            self.errors += 1
+        if answer.get("result") == "unknown" or answer.get("unknown"):
+            self.unknowns += 1
+
+    def asDict(self) -> dict:
+        latency = {
+            op: {q: percentile(list(values), p) for q, p in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))}
+            for op, values in self.latencies.items()
+        }
+        return {
+            "requests": dict(self.counts), "errors": self.errors, "unknowns": self.unknowns,
+            "batches": self.batches, "batched": self.batched, "latencyMs": latency,
+        }
+
+
+class Service:
+    # workers=0 solves in the event loop itself, for tests and debugging
+    def __init__(self, library: str | None = None, workers: int | None = None):
+        self.library = library
+        self.executor: Executor | None = None
+        if workers != 0:
+            self.executor = ProcessPoolExecutor(workers, initializer=openLibrary, initargs=(library,))
+        else:
+            openLibrary(library)
+        self.metrics = Metrics()
+        self.pending: dict[str | int, list[tuple[tuple, asyncio.Future]]] = {}
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    async def run(self, function, *args):
+        if self.executor is None:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def handle(self, request: dict) -> dict:
+        start = time.monotonic()
+        op = request.get("op", "compare")
+        try:
+            answer = await self.dispatch(op, request, start)
+        except Exception as e:
+            # every request gets its answer, whatever went wrong
+            answer = {"error": errorText(e)}
+        ms = (time.monotonic() - start) * 1000
+        self.metrics.record(op, ms, answer)
+        return {"id": request.get("id")} | answer | {"ms": ms}
+
+    async def dispatch(self, op: str, request: dict, start: float) -> dict:
+        if op == "metrics":
+            return self.metrics.asDict()
+        algorithm = request.get("algorithm", "constrPropSizeCount")
+        if algorithm not in comparisons:
+            raise RequestError(f"unknown algorithm {algorithm!r}")
+        maxSteps = request.get("maxSteps")
+        if maxSteps is not None and (type(maxSteps) is not int or maxSteps < 0):
+            raise RequestError("maxSteps must be a non-negative integer")
+        timeout = request.get("timeout")
+        if timeout is not None and (type(timeout) not in (int, float) or timeout < 0):
+            raise RequestError("timeout must be a non-negative number of seconds")
+        # the monotonic clock is shared by the worker processes
+        deadline = start + timeout if timeout is not None else None
+        t = request.get("t")
+        if not isinstance(t, str):
+            raise RequestError("t must be a type text")
+
+        if op == "match":
+            return await self.run(matchLibrary, t, algorithm, maxSteps, deadline)
+        if op != "compare":
+            raise RequestError(f"unknown op {op!r}")
+        # entry ids only come as library, so a number in s is not taken for one
+        if "library" in request:
+            s = request["library"]
+            if type(s) is not int:
+                raise RequestError("library must be an entry id")
+        else:
+            s = request.get("s")
+            if not isinstance(s, str):
+                raise RequestError("s must be a type text")
+        return await self.enqueue(s, (t, algorithm, maxSteps, deadline))
+
+    async def enqueue(self, s: str | int, item: tuple) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        group = self.pending.get(s)
+        if group is None:
+            group = self.pending[s] = []
+            asyncio.get_running_loop().call_later(batchWindow, self.flush, s)
+        group.append((item, future))
+        return await future
+
+    def flush(self, s: str | int):
+        group = self.pending.pop(s)
+        self.metrics.batches += 1
+        self.metrics.batched += len(group)
+        task = asyncio.ensure_future(self.run(solveGroup, s, [item for item, _ in group]))
+
+        def done(task: asyncio.Future):
+            for (_, future), answer in zip(group, self.answers(task, len(group))):
+                if not future.done():
+                    future.set_result(answer)
+
+        task.add_done_callback(done)
+
+    @staticmethod
+    def answers(task: asyncio.Future, count: int) -> list[dict]:
+        if task.cancelled():
+            return [{"error": "cancelled"}] * count
+        if task.exception() is not None:
+            return [{"error": errorText(task.exception())}] * count # type: ignore
+        return task.result()
+
+    async def serve(self, reader: asyncio.StreamReader, write: Callable[[bytes], None]):
+        # answers every line of reader until it ends
+        tasks = set()
+
+        async def answer(line: bytes):
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("a request is a JSON object")
+            except ValueError as e:
+                response = {"id": None, "error": f"bad request: {e}"}
+            else:
+                response = await self.handle(request)
+            write(json.dumps(response).encode() + b"\n")
+
+        while line := await reader.readline():
+            if line.strip():
+                task = asyncio.create_task(answer(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+
+
+async def serveSocket(service: Service, path: str):
+    async def connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await service.serve(reader, writer.write)
+        finally:
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(connection, path)
+    async with server:
+        await server.serve_forever()
+
+
+async def serveStdio(service: Service):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    def write(data: bytes):
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
+    await service.serve(reader, write)
+
+
+class LocalClient:
+    # calls a service in the same process, without a socket
+    def __init__(self, service: Service | None = None):
+        self.service = service if service is not None else Service(workers=0)
+        self.ids = 0
+
+    async def request(self, op: str, **fields) -> dict:
+        self.ids += 1
+        return await self.service.handle({"id": self.ids, "op": op} | fields)
+
+    async def compare(self, t: str, s: str, **budget) -> dict:
+        return await self.request("compare", t=t, s=s, **budget)
+
+    async def compareLibrary(self, t: str, entry: int, **budget) -> dict:
+        return await self.request("compare", t=t, library=entry, **budget)
+
+    async def match(self, t: str, **budget) -> dict:
+        return await self.request("match", t=t, **budget)
+
+    async def metrics(self) -> dict:
+        return await self.request("metrics")
+
+    def close(self):
+        self.service.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Comparison service over JSON lines")
+    parser.add_argument("--socket", help="Unix socket path instead of stdin and stdout")
+    parser.add_argument("--library", help="library index for match and library requests")
+    parser.add_argument("-j", "--workers", type=int, help="solving processes, 0 solves in the service")
+    options = parser.parse_args(argv)
+
+    service = Service(options.library, options.workers)
+    try:
+        if options.socket:
+            asyncio.run(serveSocket(service, options.socket))
+        else:
+            asyncio.run(serveStdio(service))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
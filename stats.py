@@ -0,0 +1,71 @@
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, ContextManager
+
+# receives the event name and its arguments
+EventHook = Callable[..., None]
+
+
+class SearchStats:
+    def __init__(self, onEvent: EventHook | None = None):
+        self.onEvent = onEvent
+        self.constraints = 0 # constraints taken off the agenda
+        self.binds = 0
+        self.branches = 0 # choice points
+        self.alternatives = 0 # pairings tried at choice points
+        self.splitRejections = 0 # choice points the splitter gave no pairing for
+        self.nogoodPrunes = 0
+        self.backtracks = 0
+        self.propagations = 0 # propagationCase calls
+        self.propagationFailures = 0
+        self.phases: dict[str, float] = {} # seconds spent in each phase
+        self.rejected: dict[str, int] = {} # pairs rejected by each invariant before searching
+
+    def emit(self, event: str, *args):
+        if self.onEvent is not None:
+            self.onEvent(event, *args)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def counted(self, alternatives):
+        # counts the pairings a splitter yields as the search takes them
+        produced = 0
+        for constraints in alternatives:
+            produced += 1
+            yield constraints
+        if produced == 0:
+            self.splitRejections += 1
+
+    def asDict(self) -> dict:
+        counters = {k: v for k, v in vars(self).items() if isinstance(v, int)}
+        return counters | {"rejected": dict(self.rejected), "phases": dict(self.phases)}
+
+    def __str__(self) -> str:
+        counters = ", ".join(f"{k}: {v}" for k, v in self.asDict().items() if isinstance(v, int))
+        rejected = ", ".join(f"{k}: {v}" for k, v in self.rejected.items())
+        phases = ", ".join(f"{k}: {v * 1000:.3f} ms" for k, v in self.phases.items())
+        return f"{counters}; rejected {rejected or 'none'}; {phases}"
+
+
+def percentile(values: list[float], q: float) -> float:
+    # linear interpolation between the closest ranks
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    i = int(k)
+    if i + 1 >= len(values):
+        return values[-1]
+    return values[i] + (values[i + 1] - values[i]) * (k - i)
+
+
+_disabled = nullcontext()
+
+
+def timed(stats: SearchStats | None, name: str) -> ContextManager:
+    # free when instrumentation is off
+    return _disabled if stats is None else stats.phase(name)
@@ -1,6 +1,7 @@
 from model import *
+from hashcons import intern, internNode
+from functools import lru_cache
 import random
-from functools import reduce
 
 def typeSort(t: Type) -> Type:
     match t:
@@ -13,28 +14,13 @@ def typeSort(t: Type) -> Type:
     assert False
 
 def typeSize(t: Type) -> int:
-    match t:
-        case Variable(_): return 1
-        case Arrow(l, r): return 1 + typeSize(l) + typeSize(r)
-        case Intersection(types): return reduce(lambda s, t: s + typeSize(t), types, 1)
-    assert(False)
+    return t.size
 
 def varsCount(t: Type) -> int:
-    match t:
-        case Variable(_): return 1
-        case Arrow(l, r): return varsCount(l) + varsCount(r)
-        case Intersection(types): return reduce(lambda c, t: c + varsCount(t), types, 0)
-    assert(False)
+    return t.occurrences
 
 def getVars(t: Type) -> set[Variable]:
-    match t:
-        case Variable(_):
-            return {t}
-        case Arrow(l, r):
-            return getVars(l).union(getVars(r))
-        case Intersection(types):
-            return reduce(lambda vs1, vs2: vs1.union(vs2), map(getVars, types), set())
-    assert False
+    return set(t.vars)
 
 def removeDuplicates(t: Type) -> Type:
     match t:
@@ -52,11 +38,47 @@ def removeDuplicates(t: Type) -> Type:
             return Intersection(types)
     assert False
 
+# sorts and deduplicates every intersection in one bottom-up pass,
+# results are interned and marked as normal
+def normalize(t: Type) -> Type:
+    done: dict[int, Type] = {}
+    for node in postorder(t, isLeaf=lambda n: n._normal):
+        if node._normal:
+            done[id(node)] = node
+            continue
+
+        match node:
+            case Variable(_):
+                normal = node
+            case Arrow(l, r):
+                normal = Arrow(done[id(l)], done[id(r)])
+            case Intersection(types):
+                # normalized members are interned, so duplicates are the same object
+                members = {id(m): m for m in (done[id(t)] for t in types)}
+                normal = Intersection(sorted(members.values(), key=lambda m: m.sortKey))
+        normal = internNode(normal)
+        normal.sortKey
+        object.__setattr__(normal, "_normal", True)
+        done[id(node)] = normal
+
+    return done[id(t)]
+
+normalCacheSize = 4096
+cachedNormalize = lru_cache(maxsize=normalCacheSize)(normalize)
+
+def setNormalCacheSize(size: int | None):
+    global cachedNormalize
+    cachedNormalize = lru_cache(maxsize=size)(normalize)
+
 def normalForm(t: Type) -> Type:
-    return typeSort(removeDuplicates(typeSort(t)))
+    if t._normal:
+        return t
+    # interning first makes the cache lookup a hash of one node
+    return cachedNormalize(intern(t))
 
 def randomRename(t: Type, allowedVars: list[Variable] | None = None, unique: bool = True) -> tuple[Type, Renaming]:
-    vars = getVars(t)
+    # sorted, so a seeded run gives the same renaming in every process
+    vars = sorted(getVars(t))
     if allowedVars is None:
         allowedVars = list(vars)
 
@@ -66,30 +88,36 @@ def randomRename(t: Type, allowedVars: list[Variable] | None = None, unique: boo
         b = random.choice(allowedVars)
         if unique:
             allowedVars.remove(b)
-        r.subs.append([a, b])
+        r.set(a, b)
 
     return r.applyTo(t), r
 
 
+# intersection of paths: arrows are distributed over the intersections on
+# their right, A -> (B /\ C) to (A -> B) /\ (A -> C), nested intersections
+# are flattened and A -> ω is dropped. Arrow lefts are organized as well and
+# a left of a single path is that path
 def organize(t: Type) -> Intersection:
-    match t:
-        case Variable(_) as var:
-            return Intersection([var])
-        case Intersection(types):
-            return Intersection([organize(t) for t in types])
-        case Arrow(l, r):
-            return Intersection([Arrow(l, t) for t in organize(r).types])
+    # the result is built with internNode, which needs interned children
+    t = intern(t)
+    paths: dict[int, list[Type]] = {}
+    for node in postorder(t):
+        match node:
+            case Variable(_):
+                paths[id(node)] = [node]
+            case Intersection(types):
+                paths[id(node)] = [p for t in types for p in paths[id(t)]]
+            case Arrow(l, r):
+                left = paths[id(l)]
+                l = left[0] if len(left) == 1 else internNode(Intersection(left))
+                paths[id(node)] = [internNode(Arrow(l, p)) for p in paths[id(r)]]
 
-    assert False
+    return internNode(Intersection(paths[id(t)]))
 
 def isPath(t: Type) -> bool:
-    match t:
-        case Variable(_):
-            return True
-        case Arrow(l, r):
-            return isPath(r)
-        case _:
-            return False
+    while isinstance(t, Arrow):
+        t = t.right
+    return isinstance(t, Variable)
 
 def isBasic(c: Constraint):
     match c.left, c.right: